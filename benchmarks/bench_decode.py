@@ -0,0 +1,129 @@
+"""
+Benchmark for the /qrimage decode cascade on a synthetic corpus.
+
+Generates QR images that mimic typical uploads (clean renders, 12MP phone photos,
+low contrast, uneven lighting, rotation, a small code in a large frame), then times
+every strategy in qr_decoder.DECODE_STRATEGIES on its own and the full cascade.
+
+Usage: python benchmarks/bench_decode.py [--write DIR] [--repeat N]
+    --write DIR  also save the corpus images to DIR for manual inspection
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import qrcode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from qr_decoder import DECODE_STRATEGIES, decode_qr_details
+
+PAYLOAD = "https://example.com/dayz/qr4me?build=benchmark-corpus"
+PHOTO_SIZE = (3024, 4032)  # 12MP phone camera, portrait
+
+
+def qr_image(module_px: int) -> np.ndarray:
+    qr = qrcode.QRCode(border=4, box_size=module_px)
+    qr.add_data(PAYLOAD)
+    return np.asarray(qr.make_image().convert("L"), dtype=np.uint8)
+
+
+def place_in_photo(code: np.ndarray, rng, angle: float = 0.0, fraction: float = 0.5, tilt: float = 0.0) -> np.ndarray:
+    """
+    Puts the code into a noisy grey frame with perspective tilt and rotation, like a photo of a screen.
+    """
+    height, width = PHOTO_SIZE
+    photo = rng.normal(150, 20, (height, width)).clip(0, 255).astype(np.uint8)
+    side = int(min(height, width) * fraction)
+    code = cv2.resize(code, (side, side), interpolation=cv2.INTER_AREA)
+
+    cx, cy = width / 2, height / 2
+    src = np.float32([[0, 0], [side, 0], [side, side], [0, side]])
+    half = side / 2
+    dst = np.float32([
+        [cx - half + tilt * side, cy - half],
+        [cx + half - tilt * side, cy - half],
+        [cx + half, cy + half],
+        [cx - half, cy + half]
+    ])
+    rotation = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
+    dst = cv2.transform(dst[None], rotation)[0].astype(np.float32)
+    warp = cv2.getPerspectiveTransform(src, dst)
+    mask = cv2.warpPerspective(np.full_like(code, 255), warp, (width, height))
+    warped = cv2.warpPerspective(code, warp, (width, height))
+    photo[mask > 0] = warped[mask > 0]
+    return cv2.GaussianBlur(photo, (5, 5), 0)
+
+
+def encode(image: np.ndarray, ext: str, quality: int = 85) -> bytes:
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == ".jpg" else []
+    ok, data = cv2.imencode(ext, image, params)
+    return data.tobytes()
+
+
+def build_corpus(seed: int = 7) -> dict:
+    """
+    name -> encoded image bytes.
+    """
+    rng = np.random.default_rng(seed)
+    code = qr_image(8)
+
+    low_contrast = place_in_photo(code, rng, angle=5).astype(np.float32)
+    low_contrast = (110 + (low_contrast - 110) * 0.35).clip(0, 255).astype(np.uint8)
+
+    uneven = place_in_photo(code, rng, angle=-8, tilt=0.05).astype(np.float32)
+    gradient = np.linspace(0.35, 1.2, uneven.shape[1], dtype=np.float32)[None, :]
+    uneven = (uneven * gradient).clip(0, 255).astype(np.uint8)
+
+    return {
+        "clean_png": encode(code, ".png"),
+        "photo_12mp_jpeg": encode(place_in_photo(code, rng, angle=3, tilt=0.04), ".jpg"),
+        "rotated_30": encode(place_in_photo(code, rng, angle=30), ".jpg"),
+        "small_in_frame": encode(place_in_photo(code, rng, fraction=0.12), ".jpg"),
+        "low_contrast": encode(low_contrast, ".jpg"),
+        "uneven_lighting": encode(uneven, ".jpg")
+    }
+
+
+def best_of(func, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--write", help="directory to save the corpus images")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+        for name, data in corpus.items():
+            ext = ".png" if data[:4] == b"\x89PNG" else ".jpg"
+            with open(os.path.join(args.write, name + ext), "wb") as f:
+                f.write(data)
+
+    names = [name for name, _, _ in DECODE_STRATEGIES]
+    print("per strategy: ms (x = failed, - = skipped at this resolution)")
+    print(f"{'image':<18}{'KB':>7}" + "".join(f"{name:>19}" for name in names) + f"{'cascade':>22}")
+    for image_name, data in corpus.items():
+        cells = []
+        for strategy in DECODE_STRATEGIES:
+            result, ms = best_of(lambda: decode_qr_details(data, [strategy]), args.repeat)
+            if strategy[0] not in result["timings"]:
+                cells.append("-")
+            else:
+                cells.append(f"{ms:.1f}" + ("" if result["text"] == PAYLOAD else " x"))
+        result, ms = best_of(lambda: decode_qr_details(data), args.repeat)
+        cascade = f"{result['strategy'] or 'failed'} {ms:.1f}ms"
+        print(f"{image_name:<18}{len(data) // 1024:>7}" + "".join(f"{cell:>19}" for cell in cells) + f"{cascade:>22}")
@@ -0,0 +1,49 @@
+"""
+Micro-benchmark for utils.permissions.is_admin_user.
+
+Compares a cold check (cache invalidated before every call, i.e. the old
+read-both-files-per-check behaviour) with the cached path.
+
+Run from anywhere: python benchmarks/bench_permissions.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from utils.permissions import is_admin_user, invalidate_permission_cache
+
+ITERATIONS = 20000
+
+
+def fake_interaction(guild_id: int, user_id: int, role_ids: list):
+    return SimpleNamespace(
+        guild=SimpleNamespace(id=guild_id),
+        user=SimpleNamespace(id=user_id, roles=[SimpleNamespace(id=r) for r in role_ids])
+    )
+
+
+def time_checks(interaction, cold: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        if cold:
+            invalidate_permission_cache()
+        is_admin_user(interaction)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+if __name__ == "__main__":
+    cases = {
+        "permitted user": fake_interaction(1166441420643639348, 1291903774872567898, []),
+        "admin role": fake_interaction(1166441420643639348, 1, [1173052585830264832]),
+        "denied": fake_interaction(1166441420643639348, 2, [3, 4, 5])
+    }
+    print(f"{'case':<16}{'uncached us':>14}{'cached us':>12}{'speedup':>10}")
+    for name, interaction in cases.items():
+        cold = time_checks(interaction, cold=True)
+        warm = time_checks(interaction, cold=False)
+        print(f"{name:<16}{cold:>14.2f}{warm:>12.2f}{cold / warm:>9.1f}x")
@@ -0,0 +1,58 @@
+"""
+Benchmark for preview cell compositing across QR matrix sizes (21x21 .. 177x177).
+
+Compares the per-cell Pillow loop (benchmarks/reference.py) with the bulk
+NumPy strip renderer used by preview_renderer (_render_rows, here over the whole
+image in one strip), and checks both produce identical pixels.
+
+Usage: python benchmarks/bench_preview.py [cell_px]   (default 16px; 64px at 177 needs ~1GB RAM)
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from preview_renderer import _render_rows
+from benchmarks.reference import render_cells_reference
+
+SIZES = [21, 29, 57, 97, 137, 177]
+OBJECT_TYPE = "WoodenCrate"
+BORDER = 2
+
+
+def random_matrix(size: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    return (rng.random((size, size)) < 0.5).tolist()
+
+
+def render_fast(matrix: list, scale: int) -> np.ndarray:
+    return _render_rows(np.asarray(matrix, dtype=bool), scale, BORDER, OBJECT_TYPE, 0, len(matrix) + BORDER * 2)
+
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+if __name__ == "__main__":
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    print(f"cell size: {scale}px")
+    print(f"{'size':>8}{'loop ms':>12}{'bulk ms':>12}{'speedup':>10}  identical")
+    for size in SIZES:
+        matrix = random_matrix(size, seed=size)
+        identical = np.array_equal(
+            np.asarray(render_cells_reference(matrix, scale, BORDER, OBJECT_TYPE)),
+            render_fast(matrix, scale)
+        )
+        loop_ms = best_of(lambda: render_cells_reference(matrix, scale, BORDER, OBJECT_TYPE))
+        bulk_ms = best_of(lambda: render_fast(matrix, scale))
+        print(f"{size:>4}x{size:<3}{loop_ms:>12.1f}{bulk_ms:>12.1f}{loop_ms / bulk_ms:>9.1f}x  {identical}")
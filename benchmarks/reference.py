@@ -0,0 +1,71 @@
+"""
+Straightforward reference implementations of the hot paths, kept as they were
+before the vectorized/cached versions. Used by the benchmarks as the "before"
+timing and as the golden source for output-equivalence checks.
+"""
+import qrcode
+from PIL import Image, ImageDraw
+
+from preview_renderer import get_thumbnail
+from qr_generator import OBJECT_CLASS_MAP, OBJECT_SIZE_ADJUSTMENTS
+
+
+def render_cells_reference(matrix: list, scale: int = 64, border: int = 2, object_type: str = "SmallProtectiveCase") -> Image.Image:
+    """
+    Per-cell paste + rectangle loop (the original render_qr_preview body, without text/save).
+    """
+    rows = len(matrix)
+    cols = len(matrix[0])
+
+    img = Image.new("RGB", ((cols + border * 2) * scale, (rows + border * 2) * scale), "white")
+    draw = ImageDraw.Draw(img)
+    thumb = get_thumbnail(object_type, scale)
+
+    for r in range(rows):
+        for c in range(cols):
+            x = (c + border) * scale
+            y = (r + border) * scale
+            if matrix[r][c]:
+                img.paste(thumb, (x, y), mask=thumb if thumb.mode == "RGBA" else None)
+            draw.rectangle([x, y, x + scale, y + scale], outline="#cccccc", width=1)
+    return img
+
+
+def qr_matrix_reference(data: str, version: int, error_correction: int, mask: int, optimize: int = 20) -> list:
+    """
+    Plain qrcode matrix (1 module border) for fixed settings, used to check that the
+    chosen settings are encoded exactly as the qrcode library would.
+    """
+    qr = qrcode.QRCode(version=version, error_correction=error_correction, box_size=1, border=1, mask_pattern=mask)
+    qr.add_data(data, optimize=optimize)
+    qr.make(fit=False)
+    return qr.get_matrix()
+
+
+def qr_to_object_list_reference(matrix: list, object_type: str, origin: dict, offset: dict, scale: float = 1.0, spacing: float = None) -> list:
+    """
+    Nested-loop object placement (the original qr_to_object_list, without the mirror kit
+    and the silent truncation at MAX_OBJECTS).
+    """
+    rows = len(matrix)
+    cols = len(matrix[0])
+    resolved_type = OBJECT_CLASS_MAP.get(object_type, object_type)
+    spacing = spacing if spacing is not None else scale * OBJECT_SIZE_ADJUSTMENTS.get(object_type, 1.0)
+
+    offset_x = round(origin["x"] - ((cols // 2) * spacing) + offset.get("x", 0), 4)
+    offset_z = round(origin["z"] - ((rows // 2) * spacing) + offset.get("z", 0), 4)
+    top_y = origin["y"] + 0.1
+
+    objects = []
+    for row in range(rows):
+        for col in range(cols):
+            if matrix[row][col]:
+                objects.append({
+                    "name": resolved_type,
+                    "pos": [offset_x + (col * spacing), offset_z + (row * spacing), round(top_y, 14)],
+                    "ypr": [0.0, 0.0, 90.0],
+                    "scale": scale,
+                    "enableCEPersistency": 0,
+                    "customString": ""
+                })
+    return objects
@@ -0,0 +1,366 @@
+"""
+Offline benchmark suite for the build hot paths (no Discord token or network needed).
+
+Stages and what they sweep:
+- generate_qr_matrix: payload lengths from QR version 1 to 40 (LRU caches cleared per call)
+- qr_to_object_list: matrix sizes 21..177 x object types x grid/merged layout
+- render_qr_preview: matrix sizes x preview format (PNG, WebP under a byte budget)
+- save_object_json: matrix sizes x compact/pretty output
+- get_guild_config / is_admin_user: guild counts (isolated temp stores, real files untouched)
+
+Every case records wall time (min/median over --repeat runs), peak traced memory and
+net allocated blocks (tracemalloc, one extra run). Results are written as JSON; with
+--compare the run fails when a case got slower than --threshold. Golden checks verify
+the optimized paths against benchmarks/reference.py and the output hashes in
+benchmarks/golden.json (refresh with --update-golden after an intended output change).
+
+Usage: python benchmarks/run.py [--quick] [--stage NAME] [--output PATH] [--compare PATH]
+                                [--threshold 0.25] [--repeat N] [--update-golden]
+Exit code 1 on a regression or a failed golden check.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import utils.config_utils as config_utils
+import utils.permissions as permissions
+from qr_generator import (
+    build_layout, choose_qr_settings, generate_qr_matrix, layout_to_objects,
+    qr_to_object_list, save_object_json, ENCODING_MODES, ERROR_CORRECTION_LEVELS, MAX_TILED_OBJECTS
+)
+from preview_renderer import render_qr_preview, _render_rows
+from utils.json_store import JsonStore
+from benchmarks.reference import qr_matrix_reference, qr_to_object_list_reference, render_cells_reference
+
+GOLDEN_PATH = os.path.join(ROOT, "benchmarks", "golden.json")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+MIN_REGRESSION_MS = 0.5  # differences below this are timer noise, never a regression
+
+ORIGIN = {"x": 5000.0, "y": 0.0, "z": 5000.0}
+OFFSET = {"x": 0.0, "y": 0.0, "z": 0.0}
+
+# Payload length -> roughly QR version 1, 3, 5, 10, 20, 40 (byte mode, ECC L)
+PAYLOAD_LENGTHS = [10, 40, 100, 250, 800, 2900]
+MATRIX_SIZES = [21, 29, 57, 97, 137, 177]
+OBJECT_TYPES = ["SmallProtectiveCase", "WoodenCrate"]
+GUILD_COUNTS = [10, 100, 1000]
+
+
+def payload(length: int) -> str:
+    rng = random.Random(length)
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789/-.") for _ in range(length))
+
+
+def random_matrix(size: int) -> list:
+    rng = np.random.default_rng(size)
+    return (rng.random((size, size)) < 0.5).tolist()
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Wall time over repeat runs, then one traced run for peak memory and net allocated blocks.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+    return {
+        "ms_min": round(min(timings), 3),
+        "ms_median": round(statistics.median(timings), 3),
+        "repeat": repeat,
+        "peak_bytes": peak,
+        "net_blocks": blocks
+    }
+
+
+def isolated_stores(tmp_dir: str, guilds: int):
+    """
+    Point guild configs and admin users at temp files holding `guilds` guilds.
+    """
+    config_path = os.path.join(tmp_dir, f"guild_configs_{guilds}.json")
+    admin_path = os.path.join(tmp_dir, f"admin_users_{guilds}.json")
+    with open(config_path, "w") as f:
+        json.dump({str(1000 + g): {"defaultScale": 0.5, "custom_scale": {"WoodenCrate": 0.7}} for g in range(guilds)}, f)
+    with open(admin_path, "w") as f:
+        json.dump({str(1000 + g): [str(u) for u in range(g, g + 5)] for g in range(guilds)}, f)
+
+    config_utils._store = JsonStore(config_path, flush_delay=3600)
+    permissions.ADMIN_USERS_FILE = admin_path
+    permissions.invalidate_permission_cache()
+
+
+# --- Stages ---
+
+def bench_generate(quick: bool, repeat: int) -> dict:
+    results = {}
+    for length in PAYLOAD_LENGTHS[:4] if quick else PAYLOAD_LENGTHS:
+        text = payload(length)
+
+        def run():
+            generate_qr_matrix(text, max_objects=MAX_TILED_OBJECTS)
+
+        results[f"generate_qr_matrix/len{length}"] = dict(measure(run, repeat), params={"length": length})
+    return results
+
+
+def bench_layout(quick: bool, repeat: int) -> dict:
+    results = {}
+    for size in MATRIX_SIZES[:3] if quick else MATRIX_SIZES:
+        matrix = random_matrix(size)
+        for object_type in OBJECT_TYPES:
+            for layout_mode in ("grid", "merged"):
+                def run():
+                    layout_to_objects(build_layout(
+                        matrix, object_type, ORIGIN, OFFSET, 0.5, max_objects=MAX_TILED_OBJECTS, layout_mode=layout_mode
+                    ))
+
+                params = {"size": size, "object_type": object_type, "layout_mode": layout_mode}
+                results[f"qr_to_object_list/{size}/{object_type}/{layout_mode}"] = dict(measure(run, repeat), params=params)
+    return results
+
+
+def bench_render(quick: bool, repeat: int, tmp_dir: str) -> dict:
+    results = {}
+    for size in MATRIX_SIZES[:3] if quick else MATRIX_SIZES:
+        matrix = random_matrix(size)
+        for fmt, max_bytes in (("png", None), ("webp", 8_000_000)):
+            path = os.path.join(tmp_dir, f"preview_{size}.png")
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):  # "Saved QR preview" per call
+                    render_qr_preview(matrix, path, scale=16, object_type="WoodenCrate", fmt=fmt, max_bytes=max_bytes)
+
+            params = {"size": size, "format": fmt, "max_bytes": max_bytes, "scale": 16}
+            results[f"render_qr_preview/{size}/{fmt}"] = dict(measure(run, max(1, repeat // 2)), params=params)
+    return results
+
+
+def bench_save(quick: bool, repeat: int, tmp_dir: str) -> dict:
+    results = {}
+    for size in MATRIX_SIZES[:3] if quick else MATRIX_SIZES:
+        objects = layout_to_objects(build_layout(random_matrix(size), "WoodenCrate", ORIGIN, OFFSET, 0.5, max_objects=MAX_TILED_OBJECTS))
+        for pretty in (False, True):
+            path = os.path.join(tmp_dir, f"objects_{size}.json")
+            params = {"size": size, "objects": len(objects), "pretty": pretty}
+            results[f"save_object_json/{size}/{'pretty' if pretty else 'compact'}"] = dict(
+                measure(lambda: save_object_json(objects, path, pretty=pretty), repeat), params=params
+            )
+    return results
+
+
+def bench_storage(quick: bool, repeat: int, tmp_dir: str) -> dict:
+    results = {}
+    lookups = 1000
+    for guilds in GUILD_COUNTS[:2] if quick else GUILD_COUNTS:
+        isolated_stores(tmp_dir, guilds)
+        config_utils.get_guild_config(1000)  # first read loads the store
+
+        def configs():
+            for g in range(lookups):
+                config_utils.get_guild_config(1000 + g % guilds)
+
+        members = [
+            SimpleNamespace(guild=SimpleNamespace(id=1000 + g % guilds), user=SimpleNamespace(id=g % guilds + 2, roles=[SimpleNamespace(id=r) for r in range(3)]))
+            for g in range(lookups)
+        ]
+
+        def checks():
+            for member in members:
+                permissions.is_admin_user(member)
+
+        params = {"guilds": guilds, "calls": lookups}
+        results[f"get_guild_config/{guilds}"] = dict(measure(configs, repeat), params=params)
+        results[f"is_admin_user/{guilds}"] = dict(measure(checks, repeat), params=params)
+    return results
+
+
+# --- Golden checks ---
+
+def _sha(data) -> str:
+    return hashlib.sha256(data if isinstance(data, bytes) else json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def golden_outputs(tmp_dir: str) -> dict:
+    """
+    Hashes of current outputs for fixed inputs; compared against benchmarks/golden.json.
+    Preview pixels are hashed without the footer label, so fonts do not matter.
+    """
+    outputs = {}
+    for length in PAYLOAD_LENGTHS[:4]:
+        for minimize in ("off", "mask"):
+            outputs[f"matrix/len{length}/{minimize}"] = _sha(generate_qr_matrix(payload(length), max_objects=MAX_TILED_OBJECTS, minimize=minimize))
+
+    matrix = random_matrix(29)
+    for layout_mode in ("grid", "merged"):
+        layout = build_layout(matrix, "WoodenCrate", ORIGIN, OFFSET, 0.5, layout_mode=layout_mode)
+        path = os.path.join(tmp_dir, f"golden_{layout_mode}.json")
+        save_object_json(layout_to_objects(layout), path)
+        with open(path, "rb") as f:
+            outputs[f"object_json/29/{layout_mode}"] = _sha(f.read())
+
+    mask = np.asarray(matrix, dtype=bool)
+    outputs["preview_pixels/29/16px"] = _sha(_render_rows(mask, 16, 2, "WoodenCrate", 0, 33).tobytes())
+    return outputs
+
+
+def reference_checks() -> dict:
+    """
+    Optimized paths against the straightforward implementations in benchmarks/reference.py.
+    """
+    checks = {}
+
+    matches = True
+    for length in PAYLOAD_LENGTHS[:5]:
+        text = payload(length)
+        settings = choose_qr_settings(text, MAX_TILED_OBJECTS, "mask")
+        reference = qr_matrix_reference(
+            text, settings["version"], ERROR_CORRECTION_LEVELS[settings["error_correction"]],
+            settings["mask"], ENCODING_MODES[settings["mode"]]
+        )
+        matches &= [list(map(bool, row)) for row in reference] == generate_qr_matrix(text, max_objects=MAX_TILED_OBJECTS, minimize="mask")
+    checks["matrix_vs_qrcode"] = matches
+
+    matrix = random_matrix(29)
+    fast = qr_to_object_list(matrix, "WoodenCrate", ORIGIN, OFFSET, 0.5)
+    slow = qr_to_object_list_reference(matrix, "WoodenCrate", ORIGIN, OFFSET, 0.5)
+    # Must be identical to the loop version, not just close: any float drift changes the JSON
+    checks["objects_vs_loop"] = fast == slow
+
+    mask = np.asarray(matrix, dtype=bool)
+    reference = np.asarray(render_cells_reference(matrix, 16, 2, "WoodenCrate"))
+    checks["preview_vs_loop"] = bool(np.array_equal(reference, _render_rows(mask, 16, 2, "WoodenCrate", 0, 33)))
+    return checks
+
+
+def run_golden(tmp_dir: str, update: bool) -> dict:
+    checks = {name: "pass" if ok else "fail" for name, ok in reference_checks().items()}
+    outputs = golden_outputs(tmp_dir)
+
+    if update or not os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH, "w") as f:
+            json.dump(outputs, f, indent=2, sort_keys=True)
+        checks.update({name: "updated" for name in outputs})
+        return checks
+
+    with open(GOLDEN_PATH, "r") as f:
+        golden = json.load(f)
+    for name, digest in outputs.items():
+        checks[name] = "pass" if golden.get(name) == digest else ("missing" if name not in golden else "fail")
+    return checks
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> list:
+    """
+    Cases whose median got slower than baseline by more than threshold (and MIN_REGRESSION_MS).
+    """
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        new_ms, old_ms = result["ms_median"], old["ms_median"]
+        if new_ms > old_ms * (1 + threshold) and new_ms - old_ms > MIN_REGRESSION_MS:
+            regressions.append((name, old_ms, new_ms))
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+STAGES = ["generate", "layout", "render", "save", "storage"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast smoke run")
+    parser.add_argument("--stage", choices=STAGES, action="append", help="only run these stages")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown ratio (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args()
+
+    stages = args.stage or STAGES
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="qr4me_bench_") as tmp_dir:
+        for stage in stages:
+            start = time.perf_counter()
+            if stage == "generate":
+                stage_results = bench_generate(args.quick, args.repeat)
+            elif stage == "layout":
+                stage_results = bench_layout(args.quick, args.repeat)
+            elif stage == "render":
+                stage_results = bench_render(args.quick, args.repeat, tmp_dir)
+            elif stage == "save":
+                stage_results = bench_save(args.quick, args.repeat, tmp_dir)
+            else:
+                stage_results = bench_storage(args.quick, args.repeat, tmp_dir)
+            results.update(stage_results)
+            print(f"[bench] {stage}: {len(stage_results)} cases in {time.perf_counter() - start:.1f}s")
+        golden = run_golden(tmp_dir, args.update_golden)
+
+    print(f"\n{'case':<52}{'median ms':>11}{'min ms':>10}{'peak KB':>10}{'blocks':>9}")
+    for name, result in results.items():
+        print(f"{name:<52}{result['ms_median']:>11.2f}{result['ms_min']:>10.2f}{result['peak_bytes'] // 1024:>10}{result['net_blocks']:>9}")
+    print("\ngolden checks: " + ", ".join(f"{name}={status}" for name, status in golden.items()))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        },
+        "results": results,
+        "golden": golden
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] Results written to {args.output}")
+
+    failed = [name for name, status in golden.items() if status == "fail"]
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    for name, old_ms, new_ms in regressions:
+        print(f"❌ Regression: {name} {old_ms:.2f}ms -> {new_ms:.2f}ms")
+    for name in failed:
+        print(f"❌ Golden check failed: {name}")
+    sys.exit(1 if regressions or failed else 0)
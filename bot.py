@@ -7,6 +7,11 @@ import json
 
 from config import CONFIG
 from utils.permissions import add_admin_user  # ✅ Auto permit on join
+from utils.config_utils import migrate_guild_configs
+from preview_renderer import preload_assets
+from utils.build_cache import warm_cache_index
+from utils.metrics import start_loop_lag_monitor, observe, inc
+from utils.metrics_server import METRICS_HTTP_ENABLED, start_metrics_server, discord_http_trace, instrument_discord_logging
 
 # --- Bot Setup ---
 intents = discord.Intents.default()
@@ -14,7 +19,8 @@ intents.guilds = True
 intents.members = True  # ✅ Required to detect roles
 intents.message_content = True  # Optional, used if reading message text
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# ✅ Discord REST latency is only traced when the Prometheus endpoint is enabled
+bot = commands.Bot(command_prefix="!", intents=intents, http_trace=discord_http_trace() if METRICS_HTTP_ENABLED else None)
 
 # --- Auto Config Setup ---
 def load_or_init_guild_config(guild_id: int, invoking_user_id: int) -> dict:
@@ -58,12 +64,22 @@ async def on_guild_join(guild):
 @bot.event
 async def on_ready():
     print(f"✅ Logged in as {bot.user}")
+    start_loop_lag_monitor()  # ✅ Event-loop lag samples for /botstats
+    await start_metrics_server(bot)  # ✅ No-op unless metrics_http_enabled
     try:
         synced = await bot.tree.sync()
         print(f"🔁 Synced {len(synced)} command(s)")
     except Exception as e:
         print(f"❌ Sync failed: {e}")
 
+# --- Command Latency (for /metrics) ---
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    # Measured from when Discord created the interaction, i.e. what the user waited
+    elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    observe("command_duration_seconds", max(0.0, elapsed), command=command.qualified_name)
+    inc("commands", command=command.qualified_name)
+
 # --- Legacy Admin Role Check (fallback for core config use) ---
 def is_admin(interaction: discord.Interaction):
     if not CONFIG["admin_roles"]:
@@ -75,6 +91,7 @@ def is_admin(interaction: discord.Interaction):
 async def load_extensions():
     await bot.load_extension("commands.qrbuild")
     await bot.load_extension("commands.qrimage")
+    await bot.load_extension("commands.qrbatch")
     await bot.load_extension("commands.preview")
     await bot.load_extension("commands.pushgallery")
     await bot.load_extension("commands.setorigin")
@@ -84,9 +101,15 @@ async def load_extensions():
     await bot.load_extension("commands.revokeperms")
     await bot.load_extension("commands.help")
     await bot.load_extension("commands.qr_settings")
+    await bot.load_extension("commands.botstats")
 
 # --- Launch Bot ---
 if __name__ == "__main__":
+    if METRICS_HTTP_ENABLED:
+        instrument_discord_logging()  # ✅ Count 429 back-offs reported by discord.http
+    migrate_guild_configs()  # ✅ Fill missing config defaults once instead of on every read
+    preload_assets()  # ✅ Thumbnails + font loaded once, not per render
+    warm_cache_index()  # ✅ Cache dir walked here, not by the first /metrics scrape on the event loop
     asyncio.run(load_extensions())
     token = os.getenv("DISCORD_BOT_TOKEN") or CONFIG["discord_token"]
     bot.run(token)
@@ -0,0 +1,403 @@
+import asyncio
+import inspect
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+from config import CONFIG
+from qr_generator import build_layout, mirror_backdrop_object, object_budget, symbol_label, QRCapacityError, MAX_OBJECTS, MAX_TILED_OBJECTS
+from object_serializer import write_layout_json
+from preview_renderer import render_preview, render_tile_pyramid, render_contact_sheet, preview_path_for
+from tile_exporter import export_tiles
+from utils.build_cache import build_key, copy_artifact, get_qr_code, lookup_artifacts, merge_cache_stats, store_artifacts
+from utils.build_queue import build_slot, BuildQueueFull, MAX_CONCURRENT_BUILDS
+from utils.executor import get_executor_info, run_job
+from utils.metrics import StageTimer
+from utils.single_flight import SingleFlight
+from zip_packager import create_qr_zip, create_batch_zip
+
+BUILD_ROOT = os.path.join("outputs", "builds")
+BUILD_HISTORY_PER_GUILD = CONFIG["build_history_per_guild"]
+
+BUILD_FLIGHTS = SingleFlight()
+
+ZIP_NAME = "QR4ME.zip"
+TILES_ARCHIVE_NAME = "QR4ME_tiles.zip"
+BATCH_ARCHIVE_NAME = "QR4ME_batch.zip"
+CONTACT_SHEET_NAME = "contact_sheet.png"
+PYRAMID_NAME = "qr_preview.dzi"
+PYRAMID_FILES_NAME = "qr_preview_files"
+
+
+def new_build_dir(guild_id: str) -> str:
+    """
+    Private working directory for one build, so concurrent builds never share output paths.
+    Older build directories beyond BUILD_HISTORY_PER_GUILD are pruned.
+    """
+    build_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f_") + uuid.uuid4().hex[:6]
+    guild_dir = os.path.join(BUILD_ROOT, str(guild_id))
+    build_dir = os.path.join(guild_dir, build_id)
+    os.makedirs(build_dir, exist_ok=True)
+
+    # Directories younger than the job timeout may still belong to a running build
+    cutoff = time.time() - CONFIG["build_job_timeout"]
+    for old_build in sorted(os.listdir(guild_dir))[:-BUILD_HISTORY_PER_GUILD]:
+        old_dir = os.path.join(guild_dir, old_build)
+        if os.path.getmtime(old_dir) < cutoff:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    return build_dir
+
+
+def build_output_paths(guild_id: str) -> tuple:
+    """
+    (object_json_path, preview_path) inside a fresh build directory.
+    """
+    build_dir = new_build_dir(guild_id)
+    return os.path.join(build_dir, "QR4ME.json"), os.path.join(build_dir, "qr_preview.png")
+
+
+def build_readme(rows: int, cols: int, object_count: int, object_type: str, scale: float, spacing: float, mirror: bool, qr_info: dict) -> str:
+    """
+    README.txt summary packed into the build ZIP.
+    """
+    return (
+        f"QR Size: {rows}x{cols} ({qr_info.get('symbol', 'QR')})\n"
+        f"Total Objects: {object_count}\n"
+        f"Object Used: {object_type}\n"
+        f"Scale: {scale} | Spacing: {spacing}\n"
+        f"Mirror Test Kit: {'Enabled' if mirror else 'Disabled'}"
+    )
+
+
+def run_build(
+    text: str,
+    object_type: str,
+    origin: dict,
+    offset: dict,
+    scale: float,
+    spacing: float,
+    object_output_path: str,
+    preview_output_path: str,
+    include_mirror_kit: bool = False,
+    mirror_backdrop: bool = False,
+    preview_format: str = None,
+    preview_max_bytes: int = None,
+    minimize: str = "off",
+    layout_mode: str = "grid",
+    symbology: str = "qr",
+    tile_objects: int = None,
+    preview_pyramid: bool = False
+) -> dict:
+    """
+    Runs the full QR build (matrix -> object layout -> JSON -> preview) for one request.
+    Repeat builds with identical inputs are served from the artifact cache.
+
+    Parameters:
+    - include_mirror_kit: add the DoorTestCamera + Land_Mirror_Test_Kit pair (slash commands)
+    - mirror_backdrop: prepend the large MirrorTestKit backdrop (Approve + Rebuild)
+    - preview_format / preview_max_bytes: see render_preview(); the preview extension follows the format
+    - minimize: object minimization mode, see qr_generator.MINIMIZE_MODES
+    - layout_mode: "grid" or "merged" (square blocks as one scaled object), see qr_generator.LAYOUT_MODES
+    - symbology: "qr", "micro", "rmqr" or "auto" (fewest objects), see qr_generator.SYMBOLOGIES
+    - tile_objects: also export the layout as tiles of at most this many objects
+      (QR4ME_tiles.zip with a manifest); lifts the object budget to MAX_TILED_OBJECTS (version 40)
+    - preview_pyramid: also write a Deep Zoom tile pyramid (qr_preview.dzi + qr_preview_files/)
+      for the web gallery's zoom viewer
+
+    Returns a dict with matrix, rows, cols, object_count, qr_info (symbol label, version,
+    error correction, mask, objects_saved, tiles, preview render stats incl. peak memory),
+    the output paths (zip_output_path is the QR4ME.zip package of JSON + preview + README;
+    tiles_path / pyramid_path are None unless requested), output_bytes, per-stage timings
+    in milliseconds, a cached flag and cache_stats (this build's own cache hits, misses and evictions).
+    Raises QRCapacityError when the text cannot be laid out within the object budget.
+    """
+    key = build_key(
+        text, object_type, scale, spacing, origin, offset,
+        include_mirror_kit, mirror_backdrop, preview_format, preview_max_bytes, minimize, layout_mode, symbology, tile_objects,
+        preview_pyramid
+    )
+    timer = StageTimer()
+    cache_stats = {}  # counted locally: other builds on the thread pool share CACHE_STATS
+    preview_output_path = preview_path_for(preview_output_path, preview_format)
+    tiles_path = os.path.join(os.path.dirname(object_output_path), TILES_ARCHIVE_NAME) if tile_objects else None
+    pyramid_path = os.path.join(os.path.dirname(preview_output_path), PYRAMID_NAME) if preview_pyramid else None
+    cached = lookup_artifacts(key, cache_stats)
+
+    if cached:
+        try:
+            with timer.stage("cache_restore"):
+                os.makedirs(os.path.dirname(object_output_path), exist_ok=True)
+                os.makedirs(os.path.dirname(preview_output_path), exist_ok=True)
+                shutil.copyfile(cached["object_json_path"], object_output_path)
+                shutil.copyfile(cached["preview_path"], preview_output_path)
+                if tiles_path:
+                    shutil.copyfile(cached["extra_paths"][TILES_ARCHIVE_NAME], tiles_path)
+                if pyramid_path:
+                    copy_artifact(cached["extra_paths"][PYRAMID_NAME], pyramid_path)
+                    copy_artifact(cached["extra_paths"][PYRAMID_FILES_NAME], os.path.join(os.path.dirname(pyramid_path), PYRAMID_FILES_NAME))
+        except OSError as e:
+            # Evicted by a concurrent build between lookup and copy: build it afresh
+            print(f"[build_pipeline] ⚠️ Cache entry {key[:12]} vanished during restore ({e}); rebuilding")
+            cached = None
+
+    if cached:
+        matrix = cached["matrix"]
+        object_count = cached["object_count"]
+        qr_info = cached["qr_info"]
+        object_json_data = preview_data = None
+    else:
+        max_objects = MAX_TILED_OBJECTS if tile_objects else MAX_OBJECTS
+        with timer.stage("encode"):
+            qr_code = get_qr_code(text, object_budget(include_mirror_kit, max_objects), minimize, symbology, cache_stats)
+        matrix = qr_code["matrix"]
+        qr_info = {
+            "symbol": symbol_label(qr_code),
+            "symbology": qr_code["symbology"],
+            "version": qr_code["version"],
+            "error_correction": qr_code["error_correction"],
+            "mask": qr_code["mask"],
+            "objects_saved": qr_code["baseline_dark_modules"] - qr_code["dark_modules"]
+        }
+        with timer.stage("layout"):
+            layout = build_layout(
+                matrix,
+                object_type,
+                origin,
+                offset,
+                scale=scale,
+                spacing=spacing,
+                include_mirror_kit=include_mirror_kit,
+                max_objects=max_objects,
+                layout_mode=layout_mode
+            )
+            if mirror_backdrop:
+                layout["extras"].insert(0, mirror_backdrop_object(origin, scale))
+
+        with timer.stage("write_json"):
+            object_json_data = write_layout_json(layout, object_output_path, pretty=CONFIG["pretty_object_json"])
+        object_count = len(layout["extras"]) + len(layout["objects"])
+        if tiles_path:
+            with timer.stage("tiles"):
+                manifest = export_tiles(
+                    layout,
+                    tiles_path,
+                    tile_objects,
+                    pretty=CONFIG["pretty_object_json"],
+                    metadata={"symbol": qr_info["symbol"], "object_type": object_type}
+                )
+            qr_info["tiles"] = len(manifest["tiles"])
+        with timer.stage("preview"):
+            preview = render_preview(
+                matrix,
+                preview_output_path,
+                object_type=object_type,
+                fmt=preview_format,
+                max_bytes=preview_max_bytes,
+                layout_mode=layout_mode
+            )
+        preview_output_path = preview.pop("path")
+        preview_data = preview.pop("data")
+        qr_info["preview"] = preview
+        print(
+            f"[build_pipeline] Preview {preview['width']}x{preview['height']}px at {preview['cell_size']}px/cell, "
+            f"peak memory {preview['peak_memory_bytes'] / 1024 / 1024:.1f} MB{' (streamed)' if preview['streamed'] else ''}"
+        )
+
+        extra_paths = {TILES_ARCHIVE_NAME: tiles_path} if tiles_path else {}
+        if pyramid_path:
+            with timer.stage("pyramid"):
+                render_tile_pyramid(matrix, pyramid_path, object_type=object_type, layout_mode=layout_mode)
+            extra_paths[PYRAMID_NAME] = pyramid_path
+            extra_paths[PYRAMID_FILES_NAME] = os.path.join(os.path.dirname(pyramid_path), PYRAMID_FILES_NAME)
+        with timer.stage("cache_store"):
+            store_artifacts(
+                key, matrix, object_count, object_output_path, preview_output_path, qr_info,
+                extra_paths=extra_paths or None, stats=cache_stats
+            )
+
+    # Packaged on every build (cheap: the preview is stored, only the JSON is deflated);
+    # fresh builds pack the bytes they just produced, cache hits read the restored files
+    with timer.stage("package"):
+        zip_output_path = create_qr_zip(
+            object_output_path,
+            preview_output_path,
+            os.path.join(os.path.dirname(object_output_path), ZIP_NAME),
+            extra_text=build_readme(
+                len(matrix), len(matrix[0]), object_count, object_type, scale, spacing,
+                include_mirror_kit or mirror_backdrop, qr_info
+            ),
+            object_json_data=object_json_data,
+            preview_data=preview_data
+        )
+
+    return {
+        "matrix": matrix,
+        "rows": len(matrix),
+        "cols": len(matrix[0]),
+        "object_count": object_count,
+        "qr_info": qr_info,
+        "object_output_path": object_output_path,
+        "preview_output_path": preview_output_path,
+        "zip_output_path": zip_output_path,
+        "tiles_path": tiles_path,
+        "pyramid_path": pyramid_path,
+        "output_bytes": sum(os.path.getsize(path) for path in (object_output_path, preview_output_path, zip_output_path, tiles_path) if path),
+        "timings": timer.finish(),
+        "cache_stats": cache_stats,
+        "cached": cached is not None,
+        "shared": False
+    }
+
+
+async def run_build_async(*args, **kwargs) -> dict:
+    """
+    run_build() behind single-flight coalescing, the global build queue and the worker pool.
+
+    Identical requests already in flight (same build_key) do not start a second build:
+    they wait for the running one and receive a copy of its artifacts in their own build
+    directory (builds of different guilds never point at each other's files), flagged with "shared": True.
+    Raises BuildQueueFull when the queue is saturated, asyncio.TimeoutError on job timeout
+    and QRCapacityError when the text does not fit the object budget.
+    """
+    params = inspect.signature(run_build).bind(*args, **kwargs)
+    params.apply_defaults()
+    p = params.arguments
+    key = build_key(
+        p["text"], p["object_type"], p["scale"], p["spacing"], p["origin"], p["offset"],
+        p["include_mirror_kit"], p["mirror_backdrop"], p["preview_format"], p["preview_max_bytes"], p["minimize"], p["layout_mode"],
+        p["symbology"], p["tile_objects"], p["preview_pyramid"]
+    )
+
+    async def work():
+        queued = time.perf_counter()
+        async with build_slot():
+            queue_wait = round((time.perf_counter() - queued) * 1000, 2)
+            result = await run_job(run_build, *args, **kwargs)
+        if get_executor_info()["mode"] == "process":
+            # The worker process counted the cache lookups; this process never saw them
+            merge_cache_stats(result["cache_stats"])
+        result["timings"] = dict(result["timings"], queue_wait=queue_wait)
+        return result
+
+    result, shared = await BUILD_FLIGHTS.do(key, work)
+    if not shared:
+        return result
+    return await run_job(copy_shared_build, result, p["object_output_path"], p["preview_output_path"])
+
+
+def copy_shared_build(result: dict, object_output_path: str, preview_output_path: str) -> dict:
+    """
+    A coalesced caller's copy of the leader's build: every artifact is copied into the
+    caller's own directories and the result points there, flagged "shared": True.
+    """
+    timer = StageTimer()
+    object_dir = os.path.dirname(object_output_path)
+    preview_dir = os.path.dirname(preview_output_path)
+
+    def copy_to(path: str, target_dir: str, name: str = None) -> str | None:
+        if not path:
+            return None
+        target = os.path.join(target_dir, name or os.path.basename(path))
+        copy_artifact(path, target)
+        return target
+
+    with timer.stage("cache_restore"):
+        os.makedirs(object_dir, exist_ok=True)
+        os.makedirs(preview_dir, exist_ok=True)
+        copied = dict(
+            result,
+            object_output_path=copy_to(result["object_output_path"], object_dir, os.path.basename(object_output_path)),
+            preview_output_path=copy_to(result["preview_output_path"], preview_dir),
+            zip_output_path=copy_to(result["zip_output_path"], object_dir),
+            tiles_path=copy_to(result["tiles_path"], object_dir),
+            pyramid_path=copy_to(result["pyramid_path"], preview_dir),
+            shared=True
+        )
+        if result["pyramid_path"]:
+            copy_to(os.path.join(os.path.dirname(result["pyramid_path"]), PYRAMID_FILES_NAME), preview_dir)
+    copied["timings"] = dict(timer.finish(), queue_wait=result["timings"].get("queue_wait", 0.0))
+    copied["cache_stats"] = {}
+    return copied
+
+
+async def run_batch_async(jobs: list, batch_dir: str, on_progress=None) -> dict:
+    """
+    Runs several builds in parallel and packs them into one archive plus a contact sheet.
+
+    Parameters:
+    - jobs: dicts with "name" (file stem), "caption" (contact sheet label), "meta"
+      (fields recorded in batch.json) and "build" (run_build() arguments without output paths)
+    - batch_dir: each job builds into batch_dir/<name>/, the archive and sheet go in batch_dir
+    - on_progress: optional coroutine function called as (done, total, failed) after each build
+
+    Builds are submitted no faster than the build queue runs them, so a large batch never
+    fills the pending queue other commands rely on.
+    Returns {"entries" (meta + size/objects/symbol, or "error"), "built", "builds" (the
+    run_build_async() results, for metrics), "archive", "contact_sheet"};
+    archive and contact_sheet are None when nothing could be built.
+    """
+    entries = [None] * len(jobs)
+    builds = []
+    limit = asyncio.Semaphore(MAX_CONCURRENT_BUILDS)
+    progress = {"done": 0, "failed": 0}
+
+    async def build_job(index: int, job: dict):
+        job_dir = os.path.join(batch_dir, job["name"])
+        entry = dict(job["meta"])
+        async with limit:
+            for attempt in range(3):
+                try:
+                    build = await run_build_async(
+                        object_output_path=os.path.join(job_dir, "QR4ME.json"),
+                        preview_output_path=os.path.join(job_dir, "qr_preview.png"),
+                        **job["build"]
+                    )
+                except BuildQueueFull:
+                    await asyncio.sleep(1 + attempt)  # other guilds are building; back off briefly
+                    continue
+                except asyncio.TimeoutError:
+                    entry["error"] = "build timed out"
+                except QRCapacityError as e:
+                    entry["error"] = str(e)
+                else:
+                    builds.append(build)
+                    entry.update(
+                        file=f"{job['name']}.json",
+                        size=f"{build['rows']}x{build['cols']}",
+                        objects=build["object_count"],
+                        symbol=build["qr_info"].get("symbol"),
+                        object_output_path=build["object_output_path"],
+                        preview_output_path=build["preview_output_path"]
+                    )
+                break
+            else:
+                entry["error"] = "build queue full"
+
+        entries[index] = entry
+        progress["done"] += 1
+        progress["failed"] += "error" in entry
+        if on_progress:
+            await on_progress(progress["done"], len(jobs), progress["failed"])
+
+    await asyncio.gather(*(build_job(index, job) for index, job in enumerate(jobs)))
+
+    built = [entry for entry in entries if "error" not in entry]
+    if not built:
+        return {"entries": entries, "built": built, "builds": builds, "archive": None, "contact_sheet": None}
+
+    sheet_path = await run_job(
+        render_contact_sheet,
+        [entry.get("preview_output_path") for entry in entries],
+        [job["caption"] if "error" not in entry else f"{job['caption'].split(' ')[0]} (failed)" for job, entry in zip(jobs, entries)],
+        os.path.join(batch_dir, CONTACT_SHEET_NAME)
+    )
+    archive = await run_job(
+        create_batch_zip,
+        [{key: value for key, value in entry.items() if key != "preview_output_path"} for entry in entries],
+        os.path.join(batch_dir, BATCH_ARCHIVE_NAME),
+        sheet_path
+    )
+    return {"entries": entries, "built": built, "builds": builds, "archive": archive, "contact_sheet": sheet_path}
@@ -0,0 +1,106 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from build_pipeline import BUILD_FLIGHTS
+from utils.build_cache import get_cache_stats
+from utils.build_queue import get_queue_stats
+from utils.decode_cache import get_decode_cache_stats
+from utils.executor import get_executor_info
+from utils.metrics import get_metrics_summary
+from utils.permissions import is_admin_user
+
+
+def _hit_rate(hits: int, misses: int) -> str:
+    total = hits + misses
+    return f"{hits / total:.0%} of {total}" if total else "n/a"
+
+
+def _mb(value: float) -> str:
+    return f"{value / 1024 / 1024:.1f} MB"
+
+
+class BotStats(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="botstats", description="Show build timings, queue depth, cache hit rates and event-loop lag")
+    async def botstats(self, interaction: discord.Interaction):
+        if not is_admin_user(interaction):
+            await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
+            return
+
+        metrics = get_metrics_summary()
+        queue = get_queue_stats()
+        cache = get_cache_stats(scan=False)
+        decode = get_decode_cache_stats()
+        executor = get_executor_info()
+
+        embed = discord.Embed(
+            title="📊 QR-Build Bot Stats",
+            description=f"Uptime: {metrics['uptime_seconds'] // 3600}h {metrics['uptime_seconds'] % 3600 // 60}m",
+            color=discord.Color.blurple()
+        )
+
+        # ⏱️ Per-stage percentiles (milliseconds) over the last METRICS_WINDOW builds
+        if metrics["stages"]:
+            lines = [f"{'stage':<14}{'n':>5}{'p50':>9}{'p95':>9}{'p99':>9}"]
+            for stage, values in metrics["stages"].items():
+                lines.append(f"{stage:<14}{values['count']:>5}{values['p50']:>9.0f}{values['p95']:>9.0f}{values['p99']:>9.0f}")
+            stages = "```\n" + "\n".join(lines) + "\n```"
+        else:
+            stages = "No builds recorded since startup."
+        embed.add_field(name="⏱️ Build Stages (ms)", value=stages, inline=False)
+
+        builds = metrics["builds"]
+        embed.add_field(
+            name="🧱 Builds",
+            value=(
+                f"qrbuild: {builds.get('qrbuild', 0)} | qrimage: {builds.get('qrimage', 0)} | rebuild: {builds.get('rebuild', 0)} | qrbatch: {builds.get('qrbatch', 0)}\n"
+                f"Cached: {builds.get('cached', 0)} | Shared: {builds.get('shared', 0)}\n"
+                f"Objects p50/p95: {metrics['objects']['p50']:.0f} / {metrics['objects']['p95']:.0f}\n"
+                f"Output p50/p95: {_mb(metrics['output_bytes']['p50'])} / {_mb(metrics['output_bytes']['p95'])}\n"
+                f"Preview peak memory p95/max: {_mb(metrics['peak_memory_bytes']['p95'])} / {_mb(metrics['peak_memory_bytes']['max'])}"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+            name="📥 Queue",
+            value=(
+                f"Depth: {queue['depth']} / {queue['max_pending']} | Running: {queue['running']} / {queue['concurrency']}\n"
+                f"Admitted: {queue['admitted']} | Rejected: {queue['rejected']}\n"
+                f"Wait avg/max: {queue['wait_avg_ms']} / {queue['wait_max_ms']} ms\n"
+                f"In flight: {BUILD_FLIGHTS.in_flight()} | Coalesced: {BUILD_FLIGHTS.stats['shared']}\n"
+                f"Executor: {executor['mode']} × {executor['max_workers']}"
+            ),
+            inline=True
+        )
+
+        # None until the startup index is loaded; /botstats never walks the cache dir itself
+        if cache["artifact_entries"] is None:
+            artifacts = "not indexed yet"
+        else:
+            artifacts = f"{cache['artifact_entries']} entries, {_mb(cache['artifact_bytes'])}"
+        embed.add_field(
+            name="🗃️ Caches",
+            value=(
+                f"Matrix: {_hit_rate(cache['matrix_hits'], cache['matrix_misses'])}\n"
+                f"Artifacts: {_hit_rate(cache['artifact_hits'], cache['artifact_misses'])} ({artifacts})\n"
+                f"Decode: {_hit_rate(decode['attachment_hits'] + decode['content_hits'], decode['misses'])} "
+                f"({decode['entries']} / {decode['max_entries']} entries)"
+            ),
+            inline=True
+        )
+
+        lag = metrics["loop_lag_ms"]
+        embed.add_field(
+            name="🔁 Event Loop Lag",
+            value=f"p50 {lag['p50']:.1f} ms | p95 {lag['p95']:.1f} ms | p99 {lag['p99']:.1f} ms | max {lag['max']:.1f} ms",
+            inline=False
+        )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(BotStats(bot))
@@ -34,7 +34,8 @@ class Help(commands.Cog):
             name="🧱 Build Commands",
             value=(
                 "**/qrbuild** — Convert a block of text or URL into a QR code layout using in-game objects.\n"
-                "**/qrimage** — Upload a QR image (PNG/JPG) and convert it into a build layout.\n"
+                "**/qrimage** — Upload a QR image (PNG/JPG) and convert it into a build layout. Several codes (or GIF/TIFF frames) build one layout each.\n"
+                "**/qrbatch** — Upload a CSV or text file to build many layouts at once (one ZIP + contact sheet).\n"
                 "**/preview** — Re-post the last build’s preview image and export file (ZIP/JSON).\n"
                 "**/pushgallery** — Push your latest build to the public gallery."
             ),
@@ -48,7 +49,8 @@ class Help(commands.Cog):
                 "**/setchannel** — Assign admin, gallery, or log channels.\n"
                 "**/giveperms** — Grant a user permission to use bot commands without an admin role.\n"
                 "**/revokeperms** — Revoke a user’s permission to run QR bot commands.\n"
-                "**/cleanup** — Delete the most recent build preview and ZIP/JSON output."
+                "**/cleanup** — Delete the most recent build preview and ZIP/JSON output.\n"
+                "**/botstats** — Build stage timings (p50/p95/p99), queue depth, cache hit rates and event-loop lag."
             ),
             inline=False
         )
@@ -48,7 +48,7 @@ class PushGallery(commands.Cog):
         except Exception as e:
             print(f"[pushgallery] Metadata extraction error: {e}")
 
-        save_to_gallery(preview_path, zip_path, metadata, server_id=guild_id)
+        save_to_gallery(preview_path, zip_path, metadata, server_id=guild_id, pyramid_path=guild_config.get("preview_pyramid_path"))
 
         channel_id = get_channel_id("gallery", guild_id) or guild_config.get("admin_channel_id")
         channel = self.bot.get_channel(int(channel_id)) if channel_id else None
@@ -2,13 +2,20 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import asyncio
+import json
+import time
 
-from utils.config_utils import get_guild_config, update_guild_config
+from utils.config_utils import get_guild_config, update_guild_config, guild_lock
 from utils.permissions import is_admin_user
-from qr_generator import generate_qr_matrix, qr_to_object_list, save_object_json
-from preview_renderer import render_qr_preview
-from zip_packager import create_qr_zip
+from build_pipeline import run_build_async, build_output_paths
+from preview_renderer import PREVIEW_FORMATS
+from utils.build_queue import BuildQueueFull
+from qr_generator import QRCapacityError
 from utils.channel_utils import get_channel_id
+from utils.metrics import record_build
+
+# (guild_id, rebuild settings) of Approve + Rebuild runs in progress, so a double click posts once
+_rebuilds_in_flight = set()
 
 OBJECT_SIZE_ADJUSTMENTS = {
     "SmallProtectiveCase": 1.0,
@@ -64,6 +71,7 @@ class QRAdjustPanelView(discord.ui.View):
             inline=False
         )
         embed.add_field(name="Mirror Test Kit", value=f"`{'Enabled' if mirror else 'Disabled'}`", inline=False)
+        embed.add_field(name="Preview Format", value=f"`{self.config.get('preview_format', 'png')}`", inline=True)
         embed.add_field(
             name="⚠️ Placement Warning",
             value="Make sure your scale and spacing aren't too large/too small or objects may overlap and render incorrectly in the DayZ editor. Each Object Type will require its own unique scale and spacing",
@@ -74,6 +82,17 @@ class QRAdjustPanelView(discord.ui.View):
     async def interaction_check(self, interaction: discord.Interaction):
         return is_admin_user(interaction)
 
+    async def apply_change(self, mutate):
+        """
+        Re-read the guild config under its lock, apply one change and save it, so edits
+        made elsewhere while this panel was open are not overwritten by a stale copy.
+        """
+        async with guild_lock(self.guild_id):
+            config = get_guild_config(self.guild_id)
+            mutate(config)
+            update_guild_config(self.guild_id, config)
+            self.config = config
+
     @discord.ui.button(label="🧱 Adjust Object", style=discord.ButtonStyle.secondary)
     async def adjust_object(self, interaction: discord.Interaction, button: discord.ui.Button):
         options = [
@@ -86,8 +105,7 @@ class QRAdjustPanelView(discord.ui.View):
 
         async def callback(i: discord.Interaction):
             selected = select.values[0]
-            self.config["default_object"] = selected
-            update_guild_config(self.guild_id, self.config)
+            await self.apply_change(lambda config: config.update(default_object=selected))
 
             confirm = await i.response.send_message(f"✅ Object changed to `{selected}`", ephemeral=True)
             if self.message:
@@ -126,9 +144,20 @@ class QRAdjustPanelView(discord.ui.View):
 
     @discord.ui.button(label="🪞 Toggle Mirror Test Kit", style=discord.ButtonStyle.secondary)
     async def toggle_mirror(self, interaction: discord.Interaction, button: discord.ui.Button):
-        current = self.config.get("enable_mirror_test_kit", False)
-        self.config["enable_mirror_test_kit"] = not current
-        update_guild_config(self.guild_id, self.config)
+        def toggle(config):
+            config["enable_mirror_test_kit"] = not config.get("enable_mirror_test_kit", False)
+
+        await self.apply_change(toggle)
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="🖼️ Preview Format", style=discord.ButtonStyle.secondary)
+    async def cycle_preview_format(self, interaction: discord.Interaction, button: discord.ui.Button):
+        def cycle(config):
+            formats = list(PREVIEW_FORMATS)
+            current = config.get("preview_format", "png")
+            config["preview_format"] = formats[(formats.index(current) + 1) % len(formats)] if current in formats else formats[0]
+
+        await self.apply_change(cycle)
         await interaction.response.edit_message(embed=self.build_embed(), view=self)
 
     @discord.ui.button(label="🧮 Adjust Offset", style=discord.ButtonStyle.secondary)
@@ -146,7 +175,7 @@ class QRAdjustPanelView(discord.ui.View):
             except:
                 pass
         await interaction.response.defer(ephemeral=True)
-        await handle_qr_rebuild(interaction, self.config, self.guild_id)
+        await handle_qr_rebuild(interaction, get_guild_config(self.guild_id), self.guild_id)
 
 class AdjustScaleModal(discord.ui.Modal, title="Set Scale"):
     def __init__(self, view):
@@ -157,10 +186,13 @@ class AdjustScaleModal(discord.ui.Modal, title="Set Scale"):
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            obj = self.view.config.get("default_object", "SmallProtectiveCase")
             val = float(self.children[0].value)
-            self.view.config.setdefault("custom_scale", {})[obj] = val
-            update_guild_config(self.view.guild_id, self.view.config)
+
+            def set_scale(config):
+                obj = config.get("default_object", "SmallProtectiveCase")
+                config.setdefault("custom_scale", {})[obj] = val
+
+            await self.view.apply_change(set_scale)
             await interaction.response.edit_message(embed=self.view.build_embed(), view=self.view)
         except ValueError:
             await interaction.response.send_message("❌ Invalid scale. Use a numeric value.", ephemeral=True)
@@ -175,10 +207,13 @@ class AdjustSpacingModal(discord.ui.Modal, title="Set Spacing"):
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            obj = self.view.config.get("default_object", "SmallProtectiveCase")
             val = float(self.children[0].value)
-            self.view.config.setdefault("custom_spacing", {})[obj] = val
-            update_guild_config(self.view.guild_id, self.view.config)
+
+            def set_spacing(config):
+                obj = config.get("default_object", "SmallProtectiveCase")
+                config.setdefault("custom_spacing", {})[obj] = val
+
+            await self.view.apply_change(set_spacing)
             await interaction.response.edit_message(embed=self.view.build_embed(), view=self.view)
         except ValueError:
             await interaction.response.send_message("❌ Invalid spacing. Use a numeric value.", ephemeral=True)
@@ -209,8 +244,7 @@ class AdjustOriginModal(discord.ui.Modal, title="Set Origin Coordinates"):
             y = float(self.y_input.value)  # becomes internal z
 
             # Re-map to match generator logic: [x, z, y]
-            self.view.config["origin_position"] = {"x": x, "y": z, "z": y}
-            update_guild_config(self.view.guild_id, self.view.config)
+            await self.view.apply_change(lambda config: config.update(origin_position={"x": x, "y": z, "z": y}))
 
             await interaction.response.edit_message(embed=self.view.build_embed(), view=self.view)
         except ValueError:
@@ -234,8 +268,7 @@ class AdjustOffsetModal(discord.ui.Modal, title="Set Origin Offset"):
             x = float(self.x_input.value)
             y = float(self.y_input.value)
             z = float(self.z_input.value)
-            self.view.config["originOffset"] = {"x": x, "y": y, "z": z}
-            update_guild_config(self.view.guild_id, self.view.config)
+            await self.view.apply_change(lambda config: config.update(originOffset={"x": x, "y": y, "z": z}))
             await interaction.response.edit_message(embed=self.view.build_embed(), view=self.view)
         except ValueError:
             await interaction.response.send_message("❌ Invalid offset values. Use numeric coordinates.", ephemeral=True)
@@ -248,43 +281,84 @@ async def handle_qr_rebuild(interaction: discord.Interaction, config: dict, guil
     origin = config.get("origin_position", {"x": 5000.0, "y": 0.0, "z": 5000.0})
     offset = config.get("originOffset", {"x": 0.0, "y": 0.0, "z": 0.0})
 
-    matrix = generate_qr_matrix(qr_text)
-    objects = qr_to_object_list(matrix, obj, origin, offset, scale, spacing)
-
-    # Optional Mirror Test Kit
-    if config.get("enable_mirror_test_kit"):
-        mirror_obj = {
-            "name": "MirrorTestKit",
-            "pos": [origin["x"], origin["y"] - 0.01, origin["z"]],
-            "ypr": [0.0, 90.0, 0.0],
-            "scale": max(scale * 12, 10.0),
-            "enableCEPersistency": 0,
-            "customString": ""
-        }
-        objects.insert(0, mirror_obj)
-
-    save_object_json(objects, config["object_output_path"])
-    render_qr_preview(matrix, config["preview_output_path"], object_type=obj)
+    build_args = dict(
+        text=qr_text,
+        object_type=obj,
+        origin=origin,
+        offset=offset,
+        scale=scale,
+        spacing=spacing,
+        mirror_backdrop=config.get("enable_mirror_test_kit", False),
+        preview_format=config.get("preview_format"),
+        preview_max_bytes=config.get("preview_max_bytes"),
+        minimize=config["minimize_objects"],
+        layout_mode=config.get("layout_mode", "grid"),
+        symbology=config.get("symbology", "qr"),
+        tile_objects=config.get("tile_max_objects"),
+        preview_pyramid=config.get("preview_pyramid", False)
+    )
+
+    # Only a second click on this guild's own identical rebuild is skipped; builds coalesced
+    # with other guilds or commands still get their own copy below and are posted here
+    rebuild_key = (guild_id, json.dumps(build_args, sort_keys=True))
+    if rebuild_key in _rebuilds_in_flight:
+        await interaction.followup.send("✅ This rebuild is already running; results are posted once.", ephemeral=True)
+        return
+
+    _rebuilds_in_flight.add(rebuild_key)
+    try:
+        await _run_rebuild(interaction, config, guild_id, build_args)
+    finally:
+        _rebuilds_in_flight.discard(rebuild_key)
+
+
+async def _run_rebuild(interaction: discord.Interaction, config: dict, guild_id: str, build_args: dict):
+    obj, scale, spacing, origin = build_args["object_type"], build_args["scale"], build_args["spacing"], build_args["origin"]
+    object_path, preview_path = build_output_paths(guild_id)
+    try:
+        build = await run_build_async(**build_args, object_output_path=object_path, preview_output_path=preview_path)
+    except BuildQueueFull:
+        await interaction.followup.send("⏳ The build queue is full right now. Please try again in a moment.", ephemeral=True)
+        return
+    except asyncio.TimeoutError:
+        await interaction.followup.send("❌ Rebuild timed out.", ephemeral=True)
+        return
+    except QRCapacityError as e:
+        await interaction.followup.send(f"❌ {e}", ephemeral=True)
+        return
+
+    # Point /preview, /cleanup and /pushgallery at this build's outputs
+    async with guild_lock(guild_id):
+        latest = get_guild_config(guild_id)
+        latest["object_output_path"] = build["object_output_path"]
+        latest["preview_output_path"] = build["preview_output_path"]
+        latest["preview_pyramid_path"] = build["pyramid_path"]
+        latest["zip_output_path"] = build["zip_output_path"]
+        update_guild_config(guild_id, latest)
 
     channel_id = get_channel_id("gallery", guild_id) or config.get("admin_channel_id")
     channel = interaction.client.get_channel(int(channel_id)) if channel_id else None
 
+    upload_seconds = None
     if channel:
+        upload_start = time.perf_counter()
         await channel.send(
             content=(
                 f"🧱 **QR Build Regenerated**\n"
-                f"• Size: {len(matrix)}x{len(matrix[0])}\n"
-                f"• Objects: {len(objects)}\n"
+                f"• Size: {build['rows']}x{build['cols']}\n"
+                f"• Objects: {build['object_count']}\n"
                 f"• Type: `{obj}`\n"
                 f"• Scale: `{scale}` | Spacing: `{spacing}`\n"
                 f"• Mirror Test Kit: `{'Enabled' if config.get('enable_mirror_test_kit') else 'Disabled'}`\n"
                 f"• Origin: X: {origin['x']}, Y: {origin['y']}, Z: {origin['z']}"
             ),
             files=[
-                discord.File(config["object_output_path"], filename="QR4ME.json"),
-                discord.File(config["preview_output_path"])
-            ]
+                discord.File(build["object_output_path"], filename="QR4ME.json"),
+                discord.File(build["preview_output_path"])
+            ] + ([discord.File(build["tiles_path"])] if build["tiles_path"] else [])
         )
+        upload_seconds = time.perf_counter() - upload_start
+    record_build("rebuild", build, upload_seconds)
     await interaction.followup.send("✅ Settings applied and QR rebuilt.", ephemeral=True)
 
 # ✅ Load this cog
@@ -0,0 +1,215 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+import io
+import re
+import csv
+import time
+
+from config import CONFIG
+from utils.config_utils import get_guild_config
+from build_pipeline import run_batch_async, new_build_dir
+from utils.permissions import is_admin_user
+from utils.metrics import record_build
+
+BATCH_MAX_ROWS = CONFIG["batch_max_rows"]
+PROGRESS_INTERVAL = CONFIG["batch_progress_interval"]
+BATCH_COLUMNS = ("text", "object_type", "scale", "spacing", "x", "y", "z")
+
+OBJECT_CHOICES = [
+    app_commands.Choice(name="Small Protective Case", value="SmallProtectiveCase"),
+    app_commands.Choice(name="Wooden Crate", value="WoodenCrate"),
+    app_commands.Choice(name="Improvised Container", value="ImprovisedContainer"),
+    app_commands.Choice(name="Dry Bag (Black)", value="DryBag_Black"),
+    app_commands.Choice(name="Plastic Bottle", value="PlasticBottle"),
+    app_commands.Choice(name="Cooking Pot", value="CookingPot"),
+    app_commands.Choice(name="Metal Wire", value="MetalWire"),
+    app_commands.Choice(name="Armband (Black)", value="Armband_Black"),
+    app_commands.Choice(name="Jerry Can", value="JerryCan"),
+    app_commands.Choice(name="Box Wooden", value="BoxWooden"),
+]
+OBJECT_TYPES = {choice.value.lower(): choice.value for choice in OBJECT_CHOICES}
+
+
+class BatchFileError(ValueError):
+    """Raised when a batch attachment cannot be parsed; the message lists the bad lines."""
+
+
+def parse_batch_file(content: str, filename: str, default_object: str) -> list:
+    """
+    Parse a /qrbatch attachment into rows of {"line", "text", "object_type", "scale", "spacing", "origin"}.
+
+    - .csv files (or files whose first line is a "text,..." header) are read as CSV with
+      the columns text, object_type, scale, spacing, x, y, z; everything after text is optional
+    - any other file is one text per non-empty line, so URLs containing commas stay intact
+    Empty optional fields fall back to the command / guild defaults (None here).
+    """
+    lines = content.splitlines()
+    first = lines[0].strip().lower() if lines else ""
+    is_csv = filename.lower().endswith(".csv") or first.startswith("text,")
+
+    if is_csv:
+        records = list(csv.reader(io.StringIO(content)))
+        if records and records[0] and records[0][0].strip().lower() == "text":
+            header = [name.strip().lower() for name in records[0]]
+            unknown = [name for name in header if name not in BATCH_COLUMNS]
+            if unknown:
+                raise BatchFileError(f"Unknown column(s): {', '.join(unknown)}. Expected: {', '.join(BATCH_COLUMNS)}")
+            numbered = [(number, dict(zip(header, record))) for number, record in enumerate(records[1:], start=2)]
+        else:
+            numbered = [(number, dict(zip(BATCH_COLUMNS, record))) for number, record in enumerate(records, start=1)]
+    else:
+        numbered = [(number, {"text": line}) for number, line in enumerate(lines, start=1)]
+
+    rows, errors = [], []
+    for number, fields in numbered:
+        fields = {key: (value or "").strip() for key, value in fields.items()}
+        if not fields.get("text"):
+            continue
+        try:
+            object_type = fields.get("object_type") or default_object
+            if object_type.lower() not in OBJECT_TYPES:
+                raise ValueError(f"unknown object type `{object_type}`")
+            coords = [fields.get(axis) for axis in ("x", "y", "z")]
+            origin = None
+            if any(coords):
+                origin = {axis: float(value or 0.0) for axis, value in zip(("x", "y", "z"), coords)}
+            rows.append({
+                "line": number,
+                "text": fields["text"],
+                "object_type": OBJECT_TYPES[object_type.lower()],
+                "scale": float(fields["scale"]) if fields.get("scale") else None,
+                "spacing": float(fields["spacing"]) if fields.get("spacing") else None,
+                "origin": origin
+            })
+        except ValueError as e:
+            errors.append(f"line {number}: {e}")
+
+    if errors:
+        raise BatchFileError("\n".join(errors[:10]) + (f"\n… and {len(errors) - 10} more" if len(errors) > 10 else ""))
+    if not rows:
+        raise BatchFileError("The attachment contains no rows to build.")
+    if len(rows) > BATCH_MAX_ROWS:
+        raise BatchFileError(f"{len(rows)} rows given; a batch can build at most {BATCH_MAX_ROWS}.")
+    return rows
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:32] or "qr"
+
+
+class QRBatch(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="qrbatch", description="Build many QR layouts from a CSV or text attachment")
+    @app_commands.describe(
+        file="CSV (text, object_type, scale, spacing, x, y, z) or a text file with one QR text per line",
+        object_type="Object for rows that do not name one"
+    )
+    @app_commands.choices(object_type=OBJECT_CHOICES)
+    async def qrbatch(
+        self,
+        interaction: discord.Interaction,
+        file: discord.Attachment,
+        object_type: app_commands.Choice[str] = None
+    ):
+        if not is_admin_user(interaction):
+            await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
+            return
+
+        await interaction.response.defer()
+
+        guild_id = str(interaction.guild.id)
+        config = get_guild_config(guild_id)
+        default_object = object_type.value if object_type else config.get("default_object", "SmallProtectiveCase")
+
+        try:
+            content = (await file.read()).decode("utf-8-sig")
+            rows = parse_batch_file(content, file.filename, default_object)
+        except UnicodeDecodeError:
+            await interaction.followup.send("❌ The attachment must be a UTF-8 text or CSV file.", ephemeral=True)
+            return
+        except BatchFileError as e:
+            await interaction.followup.send(f"❌ Could not read the batch file:\n{e}", ephemeral=True)
+            return
+
+        origin = config.get("origin_position", {"x": 0.0, "y": 0.0, "z": 0.0})
+        offset = config.get("originOffset", {"x": 0.0, "y": 0.0, "z": 0.0})
+        mirror_enabled = config.get("enable_mirror_test_kit", False)
+        batch_dir = new_build_dir(guild_id)
+
+        last_edit = 0.0
+
+        async def report(done: int, total: int, failed: int):
+            # One message for the whole batch, edited at most every PROGRESS_INTERVAL seconds
+            nonlocal last_edit
+            now = time.monotonic()
+            if done not in (0, total) and now - last_edit < PROGRESS_INTERVAL:
+                return
+            last_edit = now
+            await interaction.edit_original_response(
+                content=f"🧱 **QR Batch** — {done}/{total} built" + (f", {failed} failed" if failed else "")
+            )
+
+        jobs = []
+        for index, row in enumerate(rows):
+            obj_type = row["object_type"]
+            scale = row["scale"] or config.get("custom_scale", {}).get(obj_type, config.get("defaultScale", 0.5))
+            spacing = row["spacing"] or config.get("custom_spacing", {}).get(obj_type, config.get("defaultSpacing", 1.0))
+            row_origin = row["origin"] or origin
+            jobs.append({
+                "name": f"{index + 1:02d}_{_slug(row['text'])}",
+                "caption": f"#{index + 1} {row['text'][:28]}",
+                "meta": {
+                    "line": row["line"],
+                    "text": row["text"],
+                    "object_type": obj_type,
+                    "scale": scale,
+                    "spacing": spacing,
+                    "origin": row_origin
+                },
+                "build": {
+                    "text": row["text"],
+                    "object_type": obj_type,
+                    "origin": row_origin,
+                    "offset": offset,
+                    "scale": scale,
+                    "spacing": spacing,
+                    "include_mirror_kit": mirror_enabled,
+                    "preview_format": config.get("preview_format"),
+                    "preview_max_bytes": config.get("preview_max_bytes"),
+                    "minimize": config["minimize_objects"],
+                    "layout_mode": config.get("layout_mode", "grid"),
+                    "symbology": config.get("symbology", "qr")
+                }
+            })
+
+        await report(0, len(jobs), 0)
+        batch = await run_batch_async(jobs, batch_dir, on_progress=report)
+        results, built = batch["entries"], batch["built"]
+        for build in batch["builds"]:
+            record_build("qrbatch", build)
+
+        if not built:
+            await interaction.edit_original_response(
+                content="❌ **QR Batch** — no layouts could be built:\n"
+                        + "\n".join(f"• line {entry['line']}: {entry['error']}" for entry in results[:10])
+            )
+            return
+
+        failures = [entry for entry in results if entry.get("error")]
+        summary = (
+            f"🧱 **QR Batch Complete** — {len(built)}/{len(rows)} layouts, "
+            f"{sum(entry['objects'] for entry in built)} objects total"
+        )
+        if failures:
+            summary += "\n" + "\n".join(f"• line {entry['line']}: {entry['error']}" for entry in failures[:10])
+
+        await interaction.edit_original_response(
+            content=summary,
+            attachments=[discord.File(batch["archive"]), discord.File(batch["contact_sheet"])]
+        )
+
+async def setup(bot):
+    await bot.add_cog(QRBatch(bot))
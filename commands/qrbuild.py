@@ -2,12 +2,15 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import os
+import asyncio
+import time
 
-from utils.config_utils import get_guild_config, save_guild_config
-from qr_generator import generate_qr_matrix, qr_to_object_list, save_object_json
-from preview_renderer import render_qr_preview
-from zip_packager import create_qr_zip
+from utils.config_utils import get_guild_config, save_guild_config, guild_lock
+from build_pipeline import run_build_async, build_output_paths
+from utils.build_queue import BuildQueueFull
+from qr_generator import QRCapacityError
 from utils.channel_utils import get_channel_id
+from utils.metrics import record_build
 from utils.permissions import is_admin_user
 
 class QRBuild(commands.Cog):
@@ -20,7 +23,11 @@ class QRBuild(commands.Cog):
         overall_scale="Overall object scale multiplier (default 0.5 or overridden per object)",
         object_spacing="Spacing between objects (default 1.0 or overridden per object)",
         object_type="Choose the object to use for QR layout",
-        add_mirror="Add the MirrorTestKit background object (optional toggle)"
+        add_mirror="Add the MirrorTestKit background object (optional toggle)",
+        minimize_objects="Pick the QR mask (and optionally ECC level) with the fewest objects",
+        layout_mode="Merge square blocks into one larger object (crate-like objects only)",
+        symbology="Code type: standard QR, Micro QR, rectangular Micro QR, or whichever needs the fewest objects",
+        tile_objects="Allow large codes (up to 177x177) and also export them as tiles of at most this many objects"
     )
     @app_commands.choices(
         object_type=[
@@ -34,6 +41,21 @@ class QRBuild(commands.Cog):
             app_commands.Choice(name="Armband (Black)", value="Armband_Black"),
             app_commands.Choice(name="Jerry Can", value="JerryCan"),
             app_commands.Choice(name="Box Wooden", value="BoxWooden"),
+        ],
+        minimize_objects=[
+            app_commands.Choice(name="Off", value="off"),
+            app_commands.Choice(name="Mask", value="mask"),
+            app_commands.Choice(name="Mask + Error Correction", value="mask_ecc"),
+        ],
+        layout_mode=[
+            app_commands.Choice(name="Grid (one object per cell)", value="grid"),
+            app_commands.Choice(name="Merged blocks", value="merged"),
+        ],
+        symbology=[
+            app_commands.Choice(name="QR", value="qr"),
+            app_commands.Choice(name="Micro QR", value="micro"),
+            app_commands.Choice(name="Rectangular Micro QR (rMQR)", value="rmqr"),
+            app_commands.Choice(name="Auto (fewest objects)", value="auto"),
         ]
     )
     async def qrbuild(
@@ -43,7 +65,11 @@ class QRBuild(commands.Cog):
         object_type: app_commands.Choice[str],
         overall_scale: float = None,
         object_spacing: float = None,
-        add_mirror: bool = False
+        add_mirror: bool = False,
+        minimize_objects: app_commands.Choice[str] = None,
+        layout_mode: app_commands.Choice[str] = None,
+        symbology: app_commands.Choice[str] = None,
+        tile_objects: app_commands.Range[int, 50, 5000] = None
     ):
         if not is_admin_user(interaction):
             await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
@@ -60,79 +86,91 @@ class QRBuild(commands.Cog):
         # Use overrides or fallback config values
         overall_scale = overall_scale or config.get("custom_scale", {}).get(obj_type, config.get("defaultScale", 0.5))
         object_spacing = object_spacing or config.get("custom_spacing", {}).get(obj_type, config.get("defaultSpacing", 1.0))
+        minimize = minimize_objects.value if minimize_objects else config["minimize_objects"]
+        layout = layout_mode.value if layout_mode else config.get("layout_mode", "grid")
+        code_type = symbology.value if symbology else config.get("symbology", "qr")
+        tile_objects = tile_objects or config.get("tile_max_objects")
 
-        # Step 1: Generate QR matrix
-        matrix = generate_qr_matrix(text)
-
-        # Step 2: Generate object list with correct rotation
+        # Step 1-4: Matrix, object layout, JSON and preview in this build's own directory
         mirror_enabled = add_mirror or config.get("enable_mirror_test_kit", False)
-        config["enable_mirror_test_kit"] = mirror_enabled
-
-        objects = qr_to_object_list(
-            matrix,
-            obj_type,
-            origin,
-            offset,
-            scale=overall_scale,
-            spacing=object_spacing,
-            include_mirror_kit=mirror_enabled
-        )
-
-        # Step 3: Save object layout JSON
-        qr_json_path = os.path.join("data", "QR4ME.json")
-        save_object_json(objects, qr_json_path)
-        config["object_output_path"] = qr_json_path  # update config for reuse
-
-        # Step 4: Render preview image
-        render_qr_preview(matrix, config["preview_output_path"], object_type=obj_type)
-
-        # Step 5: Save updated config with correct increments
-        config["default_object"] = obj_type
-        config["defaultScale"] = overall_scale
-        config["defaultSpacing"] = object_spacing
-        config.setdefault("custom_scale", {})[obj_type] = overall_scale
-        config.setdefault("custom_spacing", {})[obj_type] = object_spacing
-        config["last_qr_data"] = text
-        save_guild_config(guild_id, config)
-
-        # Step 6: Create .zip bundle (JSON + PNG)
-        final_path = create_qr_zip(
-            config["object_output_path"],
-            config["preview_output_path"],
-            config["zip_output_path"],
-            extra_text=(
-                f"QR Size: {len(matrix)}x{len(matrix[0])}\n"
-                f"Total Objects: {len(objects)}\n"
-                f"Object Used: {obj_type}\n"
-                f"Scale: {overall_scale} | Spacing: {object_spacing}\n"
-                f"Mirror Test Kit: {'Enabled' if mirror_enabled else 'Disabled'}"
-            ),
-            export_mode="json"
-        )
+        qr_json_path, preview_path = build_output_paths(guild_id)
+        try:
+            build = await run_build_async(
+                text,
+                obj_type,
+                origin,
+                offset,
+                scale=overall_scale,
+                spacing=object_spacing,
+                object_output_path=qr_json_path,
+                preview_output_path=preview_path,
+                include_mirror_kit=mirror_enabled,
+                preview_format=config.get("preview_format"),
+                preview_max_bytes=config.get("preview_max_bytes"),
+                minimize=minimize,
+                layout_mode=layout,
+                symbology=code_type,
+                tile_objects=tile_objects,
+                preview_pyramid=config.get("preview_pyramid", False)
+            )
+        except BuildQueueFull:
+            await interaction.followup.send("⏳ The build queue is full right now. Please try again in a moment.", ephemeral=True)
+            return
+        except asyncio.TimeoutError:
+            await interaction.followup.send("❌ Build timed out. Try a shorter text or smaller settings.", ephemeral=True)
+            return
+        except QRCapacityError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
 
-        # Step 7: Post summary in gallery channel
+        # Step 5: Save updated config (re-read under the guild lock so concurrent changes survive)
+        async with guild_lock(guild_id):
+            config = get_guild_config(guild_id)
+            config["enable_mirror_test_kit"] = mirror_enabled
+            config["object_output_path"] = build["object_output_path"]  # update config for reuse
+            config["preview_output_path"] = build["preview_output_path"]
+            config["preview_pyramid_path"] = build["pyramid_path"]
+            config["zip_output_path"] = build["zip_output_path"]
+            config["default_object"] = obj_type
+            config["defaultScale"] = overall_scale
+            config["defaultSpacing"] = object_spacing
+            config.setdefault("custom_scale", {})[obj_type] = overall_scale
+            config.setdefault("custom_spacing", {})[obj_type] = object_spacing
+            config["last_qr_data"] = text
+            save_guild_config(guild_id, config)
+
+        qr_info = build["qr_info"]
+        objects_line = f"• Objects: {build['object_count']}"
+        if qr_info.get("objects_saved"):
+            objects_line += f" ({qr_info['objects_saved']} saved vs. default encoding)"
+
+        # Step 6: Post summary in gallery channel
         channel_id = get_channel_id("gallery", guild_id) or config.get("admin_channel_id")
         channel = self.bot.get_channel(int(channel_id)) if channel_id else None
 
         if not channel:
+            record_build("qrbuild", build)
             await interaction.followup.send("❌ Could not find configured gallery channel.", ephemeral=True)
             return
 
+        upload_start = time.perf_counter()
         await channel.send(
             content=(
                 f"🧱 **QR Build Complete**\n"
-                f"• Size: {len(matrix)}x{len(matrix[0])}\n"
-                f"• Objects: {len(objects)}\n"
+                f"• Size: {build['rows']}x{build['cols']} ({qr_info.get('symbol', 'QR')})\n"
+                f"{objects_line}\n"
                 f"• Type: `{obj_type}`\n"
                 f"• Scale: `{overall_scale}` | Spacing: `{object_spacing}`\n"
                 f"• Origin: X: {origin['x']}, Y: {origin['y']}, Z: {origin['z']}\n"
                 f"• Mirror Test Kit: {'Enabled' if mirror_enabled else 'Disabled'}"
+                + (f"\n• Tiles: {build['qr_info'].get('tiles')} files of ≤{tile_objects} objects (see manifest.json)" if build["tiles_path"] else "")
             ),
             files=[
-                discord.File(qr_json_path, filename="QR4ME.json"),
-                discord.File(config["preview_output_path"], filename="qr_preview.png")
-            ]
+                discord.File(build["object_output_path"], filename="QR4ME.json"),
+                discord.File(config["preview_output_path"], filename="qr_preview" + os.path.splitext(config["preview_output_path"])[1])
+            ] + ([discord.File(build["tiles_path"])] if build["tiles_path"] else [])
         )
+        record_build("qrbuild", build, time.perf_counter() - upload_start)
 
         await interaction.followup.send("✅ QR build generated and posted in gallery channel.", ephemeral=True)
 
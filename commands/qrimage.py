@@ -2,24 +2,51 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import os
-import cv2
-import numpy as np
-from pyzbar.pyzbar import decode
-
-from utils.config_utils import get_guild_config, save_guild_config
-from qr_generator import generate_qr_matrix, qr_to_object_list, save_object_json
-from preview_renderer import render_qr_preview
-from zip_packager import create_qr_zip
+import asyncio
+import time
+
+from utils.config_utils import get_guild_config, save_guild_config, guild_lock
+from build_pipeline import run_build_async, run_batch_async, build_output_paths, new_build_dir
+from utils.build_queue import BuildQueueFull
+from qr_generator import QRCapacityError
+from qr_decoder import decode_qr_codes, ImageTooLargeError, MAX_IMAGE_BYTES
+from utils.executor import run_job
+from utils.decode_cache import content_hash, lookup_attachment, lookup_content, store_decoded
 from utils.channel_utils import get_channel_id
+from utils.metrics import record_build
 from utils.permissions import is_admin_user
 
+async def decode_attachment(image: discord.Attachment) -> list:
+    """
+    Every QR payload in an uploaded image (all frames of GIFs / multi-page TIFFs).
+    The attachment ID is checked before downloading and the content hash before
+    decoding, so repeat uploads skip both.
+    Raises ImageTooLargeError (checked before download) or asyncio.TimeoutError.
+    """
+    qr_texts = lookup_attachment(image.id)
+    if qr_texts is not None:
+        return qr_texts
+
+    if image.size > MAX_IMAGE_BYTES:
+        raise ImageTooLargeError(f"Image is too large (limit {MAX_IMAGE_BYTES // 1024 // 1024} MB).")
+    img_bytes = await image.read()
+    digest = await run_job(content_hash, img_bytes)
+    qr_texts = lookup_content(digest, image.id)
+    if qr_texts is not None:
+        return qr_texts
+
+    qr_texts = await run_job(decode_qr_codes, img_bytes)
+    if qr_texts:
+        store_decoded(digest, qr_texts, image.id)
+    return qr_texts
+
 class QRImage(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     @app_commands.command(name="qrimage", description="Upload a QR code image to generate a DayZ object layout")
     @app_commands.describe(
-        image="Upload a PNG or JPG of a QR code",
+        image="Upload a PNG/JPG of one or more QR codes (animated GIF / multi-page TIFF: every frame)",
         scale="Overall object scale (default 0.5 or overridden per object)",
         object_spacing="Spacing between objects (default 1.0 or overridden per object)",
         object_type="Choose the object to use for QR layout",
@@ -62,77 +89,168 @@ class QRImage(commands.Cog):
         # Fallback or override values
         scale = scale or config.get("custom_scale", {}).get(obj_type, config.get("defaultScale", 0.5))
         object_spacing = object_spacing or config.get("custom_spacing", {}).get(obj_type, config.get("defaultSpacing", 1.0))
+        tile_objects = config.get("tile_max_objects")
 
-        # Step 1: Decode QR from image
-        img_bytes = await image.read()
-        np_array = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-        decoded = decode(img)
+        # Step 1: Decode QR from image (re-uploads of the same image are answered from the decode cache)
+        try:
+            qr_texts = await decode_attachment(image)
+        except ImageTooLargeError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        except asyncio.TimeoutError:
+            qr_texts = []
 
-        if not decoded:
+        if not qr_texts:
             await interaction.followup.send("❌ Failed to decode QR code from the image.", ephemeral=True)
             return
 
-        qr_text = decoded[0].data.decode("utf-8")
-
-        # Step 2: Build QR matrix
-        matrix = generate_qr_matrix(qr_text)
-
-        # Step 3: Generate object layout
         mirror_enabled = add_mirror or config.get("enable_mirror_test_kit", False)
-        config["enable_mirror_test_kit"] = mirror_enabled
-
-        objects = qr_to_object_list(
-            matrix,
-            obj_type,
-            origin,
-            offset,
-            scale=scale,
-            spacing=object_spacing,
-            include_mirror_kit=mirror_enabled
-        )
+        if len(qr_texts) > 1:
+            await self.build_all(interaction, qr_texts, obj_type, scale, object_spacing, mirror_enabled)
+            return
+        qr_text = qr_texts[0]
 
-        # Step 4: Save object JSON and preview
-        qr_json_path = os.path.join("data", "QR4ME.json")
-        save_object_json(objects, qr_json_path)
-        config["object_output_path"] = qr_json_path  # set explicitly for reuse
-        render_qr_preview(matrix, config["preview_output_path"], object_type=obj_type)
-
-        # Step 5: Save config updates
-        config["default_object"] = obj_type
-        config["defaultScale"] = scale
-        config["defaultSpacing"] = object_spacing
-        config.setdefault("custom_scale", {})[obj_type] = scale
-        config.setdefault("custom_spacing", {})[obj_type] = object_spacing
-        config["last_qr_data"] = qr_text
-        save_guild_config(guild_id, config)
+        # Step 2-4: Matrix, object layout, JSON and preview in this build's own directory
+        qr_json_path, preview_path = build_output_paths(guild_id)
+        try:
+            build = await run_build_async(
+                qr_text,
+                obj_type,
+                origin,
+                offset,
+                scale=scale,
+                spacing=object_spacing,
+                object_output_path=qr_json_path,
+                preview_output_path=preview_path,
+                include_mirror_kit=mirror_enabled,
+                preview_format=config.get("preview_format"),
+                preview_max_bytes=config.get("preview_max_bytes"),
+                minimize=config["minimize_objects"],
+                layout_mode=config.get("layout_mode", "grid"),
+                symbology=config.get("symbology", "qr"),
+                tile_objects=tile_objects,
+                preview_pyramid=config.get("preview_pyramid", False)
+            )
+        except BuildQueueFull:
+            await interaction.followup.send("⏳ The build queue is full right now. Please try again in a moment.", ephemeral=True)
+            return
+        except asyncio.TimeoutError:
+            await interaction.followup.send("❌ Build timed out. Try a shorter text or smaller settings.", ephemeral=True)
+            return
+        except QRCapacityError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+
+        # Step 5: Save config updates (re-read under the guild lock so concurrent changes survive)
+        async with guild_lock(guild_id):
+            config = get_guild_config(guild_id)
+            config["enable_mirror_test_kit"] = mirror_enabled
+            config["object_output_path"] = build["object_output_path"]  # set explicitly for reuse
+            config["preview_output_path"] = build["preview_output_path"]
+            config["preview_pyramid_path"] = build["pyramid_path"]
+            config["zip_output_path"] = build["zip_output_path"]
+            config["default_object"] = obj_type
+            config["defaultScale"] = scale
+            config["defaultSpacing"] = object_spacing
+            config.setdefault("custom_scale", {})[obj_type] = scale
+            config.setdefault("custom_spacing", {})[obj_type] = object_spacing
+            config["last_qr_data"] = qr_text
+            save_guild_config(guild_id, config)
 
         # Step 6: Post to gallery
         channel_id = get_channel_id("gallery", guild_id) or config.get("admin_channel_id")
         channel = self.bot.get_channel(int(channel_id)) if channel_id else None
 
         if not channel:
+            record_build("qrimage", build)
             await interaction.followup.send("✅ Build created, but gallery channel was not found.", ephemeral=True)
             return
 
+        upload_start = time.perf_counter()
         await channel.send(
             content=(
                 f"📷 **QR Image Build Complete**\n"
                 f"• Decoded: `{qr_text}`\n"
-                f"• Size: {len(matrix)}x{len(matrix[0])}\n"
-                f"• Objects: {len(objects)}\n"
+                f"• Size: {build['rows']}x{build['cols']}\n"
+                f"• Objects: {build['object_count']}\n"
                 f"• Type: `{obj_type}`\n"
                 f"• Scale: `{scale}` | Spacing: `{object_spacing}`\n"
                 f"• Origin: X: {origin['x']}, Y: {origin['y']}, Z: {origin['z']}\n"
                 f"• Mirror Test Kit: {'Enabled' if mirror_enabled else 'Disabled'}"
+                + (f"\n• Tiles: {build['qr_info'].get('tiles')} files of ≤{tile_objects} objects (see manifest.json)" if build["tiles_path"] else "")
             ),
             files=[
-                discord.File(qr_json_path, filename="QR4ME.json"),
-                discord.File(config["preview_output_path"], filename="qr_preview.png")
-            ]
+                discord.File(build["object_output_path"], filename="QR4ME.json"),
+                discord.File(config["preview_output_path"], filename="qr_preview" + os.path.splitext(config["preview_output_path"])[1])
+            ] + ([discord.File(build["tiles_path"])] if build["tiles_path"] else [])
         )
+        record_build("qrimage", build, time.perf_counter() - upload_start)
 
         await interaction.followup.send("✅ QR image decoded and build posted in gallery channel.", ephemeral=True)
 
+    async def build_all(self, interaction: discord.Interaction, qr_texts: list, obj_type: str, scale: float, object_spacing: float, mirror_enabled: bool):
+        """
+        One layout per decoded code, built in parallel, posted as one archive + contact sheet.
+        The guild's "latest build" paths are left alone: there is no single build to point at.
+        """
+        guild_id = str(interaction.guild.id)
+        config = get_guild_config(guild_id)
+        origin = config.get("origin_position", {"x": 0.0, "y": 0.0, "z": 0.0})
+        offset = config.get("originOffset", {"x": 0.0, "y": 0.0, "z": 0.0})
+
+        await interaction.followup.send(f"🔍 Found {len(qr_texts)} QR codes — building one layout each…", ephemeral=True)
+        batch = await run_batch_async(
+            [
+                {
+                    "name": f"{index + 1:02d}_code",
+                    "caption": f"#{index + 1} {text[:28]}",
+                    "meta": {"code": index + 1, "text": text, "object_type": obj_type, "scale": scale, "spacing": object_spacing},
+                    "build": {
+                        "text": text,
+                        "object_type": obj_type,
+                        "origin": origin,
+                        "offset": offset,
+                        "scale": scale,
+                        "spacing": object_spacing,
+                        "include_mirror_kit": mirror_enabled,
+                        "preview_format": config.get("preview_format"),
+                        "preview_max_bytes": config.get("preview_max_bytes"),
+                        "minimize": config["minimize_objects"],
+                        "layout_mode": config.get("layout_mode", "grid"),
+                        "symbology": config.get("symbology", "qr")
+                    }
+                }
+                for index, text in enumerate(qr_texts)
+            ],
+            new_build_dir(guild_id)
+        )
+
+        for build in batch["builds"]:
+            record_build("qrimage", build)
+
+        built = batch["built"]
+        failures = [entry for entry in batch["entries"] if "error" in entry]
+        if not built:
+            await interaction.followup.send("❌ None of the decoded QR codes could be built.", ephemeral=True)
+            return
+
+        channel_id = get_channel_id("gallery", guild_id) or config.get("admin_channel_id")
+        channel = self.bot.get_channel(int(channel_id)) if channel_id else None
+        if not channel:
+            await interaction.followup.send("✅ Builds created, but gallery channel was not found.", ephemeral=True)
+            return
+
+        await channel.send(
+            content=(
+                f"📷 **QR Image Build Complete** — {len(built)}/{len(qr_texts)} codes\n"
+                + "\n".join(f"• #{entry['code']}: `{entry['text'][:60]}` — {entry['size']}, {entry['objects']} objects" for entry in built[:10])
+                + (f"\n• … and {len(built) - 10} more (see batch.json)" if len(built) > 10 else "")
+                + "".join(f"\n• #{entry['code']} failed: {entry['error']}" for entry in failures[:5])
+                + f"\n• Type: `{obj_type}` | Scale: `{scale}` | Spacing: `{object_spacing}`"
+            ),
+            files=[discord.File(batch["archive"]), discord.File(batch["contact_sheet"])]
+        )
+        await interaction.followup.send("✅ QR codes decoded and builds posted in gallery channel.", ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(QRImage(bot))
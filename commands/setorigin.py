@@ -2,7 +2,7 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 
-from utils.config_utils import get_guild_config, save_guild_config
+from utils.config_utils import get_guild_config, save_guild_config, guild_lock
 from utils.permissions import is_admin_user
 
 class SetOrigin(commands.Cog):
@@ -21,15 +21,16 @@ class SetOrigin(commands.Cog):
             return
 
         guild_id = interaction.guild.id
-        config = get_guild_config(guild_id)
+        async with guild_lock(guild_id):
+            config = get_guild_config(guild_id)
 
-        # ⬇️ Internally map z ➝ y and y ➝ z for upright placement logic
-        config["origin_position"] = {
-            "x": x,       # same
-            "y": z,       # ⬅️ remapped
-            "z": y        # ⬅️ remapped
-        }
-        save_guild_config(guild_id, config)
+            # ⬇️ Internally map z ➝ y and y ➝ z for upright placement logic
+            config["origin_position"] = {
+                "x": x,       # same
+                "y": z,       # ⬅️ remapped
+                "z": y        # ⬅️ remapped
+            }
+            save_guild_config(guild_id, config)
 
         await interaction.response.send_message(
             f"📍 **New origin position set for this server:**\n"
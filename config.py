@@ -39,5 +39,58 @@ CONFIG = {
     "permitted_users": [str(uid) for uid in file_config.get("permitted_users", [])],
 
     # ✅ Toggle for including the mirror kit object behind the QR
-    "include_mirror_kit": file_config.get("include_mirror_kit", False)
+    "include_mirror_kit": file_config.get("include_mirror_kit", False),
+
+    # Object JSON format: compact (rounded, single line) unless pretty output is requested
+    "pretty_object_json": file_config.get("pretty_object_json", False),
+
+    # Debounce window (seconds) for write-behind flushes of guild/channel JSON files
+    "store_flush_delay": float(file_config.get("store_flush_delay", 1.0)),
+
+    # Build artifact cache (matrix + object JSON + preview, keyed on build inputs)
+    "build_cache_dir": file_config.get("build_cache_dir", "data/cache"),
+    "build_cache_max_mb": file_config.get("build_cache_max_mb", 256),
+    "matrix_cache_size": file_config.get("matrix_cache_size", 256),
+
+    # Worker pool for CPU-bound build stages: "inline", "thread" or "process"
+    "build_executor_mode": os.getenv("BUILD_EXECUTOR_MODE", file_config.get("build_executor_mode", "thread")),
+    "build_max_workers": int(file_config.get("build_max_workers", 2)),
+    "build_job_timeout": float(file_config.get("build_job_timeout", 60)),
+
+    # Global build queue: concurrent builds and how many may wait before new ones are rejected
+    "build_queue_concurrency": int(file_config.get("build_queue_concurrency", 2)),
+    "build_queue_max_pending": int(file_config.get("build_queue_max_pending", 20)),
+
+    # Per-build output directories kept per guild (outputs/builds/<guild>/<build>)
+    "build_history_per_guild": int(file_config.get("build_history_per_guild", 5)),
+
+    # Preview rendering: pixel buffer ceiling (larger PNGs are streamed in strips) and max side in pixels
+    "preview_memory_limit_mb": file_config.get("preview_memory_limit_mb", 64),
+    "preview_max_side": int(file_config.get("preview_max_side", 8192)),
+
+    # /qrbatch: maximum rows per attachment and seconds between progress message edits
+    "batch_max_rows": int(file_config.get("batch_max_rows", 50)),
+    "batch_progress_interval": float(file_config.get("batch_progress_interval", 2.0)),
+
+    # QR image decoding: upload limits and the resolution tried first (phone photos are decoded reduced)
+    "decode_max_mb": file_config.get("decode_max_mb", 20),
+    "decode_max_pixels": int(file_config.get("decode_max_pixels", 40_000_000)),
+    "decode_target_side": int(file_config.get("decode_target_side", 1600)),
+    "decode_max_codes": int(file_config.get("decode_max_codes", 16)),
+    "decode_max_frames": int(file_config.get("decode_max_frames", 32)),
+
+    # Decoded /qrimage payloads kept in memory, keyed on image content hash (and attachment ID)
+    "decode_cache_size": int(file_config.get("decode_cache_size", 512)),
+    "decode_cache_ttl": float(file_config.get("decode_cache_ttl", 24 * 3600)),
+
+    # Build metrics: samples kept per stage for percentiles, and the rotating JSON-lines log
+    "metrics_window": int(file_config.get("metrics_window", 1000)),
+    "metrics_log_path": file_config.get("metrics_log_path", "data/metrics/builds.log"),
+    "metrics_log_max_mb": file_config.get("metrics_log_max_mb", 5),
+    "metrics_log_backups": int(file_config.get("metrics_log_backups", 3)),
+
+    # Optional Prometheus text endpoint (http://host:port/metrics) served from the bot's event loop
+    "metrics_http_enabled": file_config.get("metrics_http_enabled", False),
+    "metrics_http_host": file_config.get("metrics_http_host", "127.0.0.1"),
+    "metrics_http_port": int(file_config.get("metrics_http_port", 9108))
 }
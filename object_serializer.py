@@ -0,0 +1,205 @@
+import gzip
+import json
+import os
+
+# ✅ Fixed decimal precision per field (DayZ positions are metres, 4 places = 0.1mm)
+POS_PRECISION = 4
+YPR_PRECISION = 3
+SCALE_PRECISION = 4
+
+# ✅ Pre-encoded constant fragments shared by almost every grid object
+UPRIGHT_YPR = (0.0, 0.0, 90.0)
+_UPRIGHT_YPR_JSON = '"ypr":[0.0,0.0,90.0]'
+_DEFAULT_TAIL_JSON = '"enableCEPersistency":0,"customString":""}'
+
+_HEADER = '{"Objects":['
+_FOOTER = ']}'
+
+
+def _num(value: float, precision: int) -> str:
+    # repr() of a rounded float is the shortest round-tripping form: 4985.600000000001 -> 4985.6
+    return repr(round(float(value), precision))
+
+
+def _vec(values, precision: int) -> str:
+    return "[" + ",".join(_num(v, precision) for v in values) + "]"
+
+
+def encode_object(obj: dict) -> str:
+    """
+    Compact JSON for a single object with per-field rounding.
+    """
+    ypr = obj["ypr"]
+    if tuple(ypr) == UPRIGHT_YPR:
+        ypr_json = _UPRIGHT_YPR_JSON
+    else:
+        ypr_json = '"ypr":' + _vec(ypr, YPR_PRECISION)
+
+    head = (
+        '{"name":' + json.dumps(obj["name"]) +
+        ',"pos":' + _vec(obj["pos"], POS_PRECISION) +
+        "," + ypr_json +
+        ',"scale":' + _num(obj["scale"], SCALE_PRECISION) + ","
+    )
+
+    if obj.get("enableCEPersistency", 0) == 0 and obj.get("customString", "") == "":
+        return head + _DEFAULT_TAIL_JSON
+    return (
+        head +
+        '"enableCEPersistency":' + json.dumps(obj.get("enableCEPersistency", 0)) +
+        ',"customString":' + json.dumps(obj.get("customString", "")) + "}"
+    )
+
+
+def encode_layout_rows(layout: dict):
+    """
+    Yields compact JSON for each grid object of a build_layout() result
+    without materializing intermediate dicts.
+    """
+    names = [json.dumps(name) for name in layout["names"]]
+    objects = layout["objects"]
+
+    pos_rows = objects["pos"].round(POS_PRECISION).tolist()
+    ypr_rows = objects["ypr"].round(YPR_PRECISION).tolist()
+    scales = objects["scale"].round(SCALE_PRECISION).tolist()
+
+    for name, pos, ypr, scale in zip(objects["name"].tolist(), pos_rows, ypr_rows, scales):
+        if tuple(ypr) == UPRIGHT_YPR:
+            ypr_json = _UPRIGHT_YPR_JSON
+        else:
+            ypr_json = '"ypr":[' + ",".join(map(repr, ypr)) + "]"
+        yield (
+            '{"name":' + names[name] +
+            ',"pos":[' + ",".join(map(repr, pos)) + "]," +
+            ypr_json +
+            ',"scale":' + repr(scale) + "," +
+            _DEFAULT_TAIL_JSON
+        )
+
+
+def iter_object_json(objects, pretty: bool = False):
+    """
+    Yields the object file as text chunks from any iterable of object dicts.
+
+    - pretty=False: single-line compact JSON with rounded floats
+    - pretty=True: the original indent=2 layout with full float precision, for humans
+    """
+    if pretty:
+        first = True
+        for obj in objects:
+            body = json.dumps(obj, indent=2).replace("\n", "\n    ")
+            yield ('{\n  "Objects": [\n    ' if first else ",\n    ") + body
+            first = False
+        yield '{\n  "Objects": []\n}' if first else "\n  ]\n}"
+        return
+
+    yield _HEADER
+    first = True
+    for obj in objects:
+        yield encode_object(obj) if first else "," + encode_object(obj)
+        first = False
+    yield _FOOTER
+
+
+def _open_output(output_path: str, compress: bool):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    if compress:
+        return gzip.open(output_path, "wt", encoding="utf-8", compresslevel=6)
+    return open(output_path, "w", encoding="utf-8")
+
+
+def write_object_json(objects, output_path: str, pretty: bool = False, compress: bool = False) -> int:
+    """
+    Streams objects to disk as they are produced (objects may be a generator).
+    compress=True writes a gzip file (use a .json.gz path).
+    Returns the number of objects written.
+    """
+    if not pretty:
+        with ObjectStreamWriter(output_path, compress) as writer:
+            for obj in objects:
+                writer.write(obj)
+        return writer.count
+
+    count = 0
+
+    def counted():
+        nonlocal count
+        for obj in objects:
+            count += 1
+            yield obj
+
+    with _open_output(output_path, compress) as f:
+        f.writelines(iter_object_json(counted(), pretty=pretty))
+    return count
+
+
+def iter_layout_json(layout: dict, pretty: bool = False):
+    """
+    Yields a build_layout() result as text chunks. The compact path formats straight
+    from the structured array; pretty output falls back to dicts.
+    """
+    if pretty:
+        from qr_generator import layout_to_objects
+        yield from iter_object_json(layout_to_objects(layout), pretty=True)
+        return
+
+    yield _HEADER
+    first = True
+    for obj in layout["extras"]:
+        yield encode_object(obj) if first else "," + encode_object(obj)
+        first = False
+    for row in encode_layout_rows(layout):
+        yield row if first else "," + row
+        first = False
+    yield _FOOTER
+
+
+def write_layout_json(layout: dict, output_path: str, pretty: bool = False, compress: bool = False) -> bytes:
+    """
+    Writes a build_layout() result, see iter_layout_json().
+    Returns the UTF-8 JSON written (before gzip), so the caller can package it without reading the file back.
+    """
+    data = "".join(iter_layout_json(layout, pretty=pretty)).encode("utf-8")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with (gzip.open(output_path, "wb", compresslevel=6) if compress else open(output_path, "wb")) as f:
+        f.write(data)
+    return data
+
+
+class ObjectStreamWriter:
+    """
+    Incremental writer for producers that emit objects one at a time:
+
+        with ObjectStreamWriter("data/QR4ME.json") as writer:
+            for obj in produce():
+                writer.write(obj)
+
+    If the producer raises, the partial file is removed rather than closed off as valid JSON.
+    """
+
+    def __init__(self, output_path: str, compress: bool = False):
+        self.output_path = output_path
+        self.compress = compress
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = _open_output(self.output_path, self.compress)
+        self._file.write(_HEADER)
+        return self
+
+    def write(self, obj: dict):
+        self._file.write(encode_object(obj) if self.count == 0 else "," + encode_object(obj))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._file.close()
+            try:
+                os.remove(self.output_path)
+            except OSError:
+                pass
+            return False
+        self._file.write(_FOOTER)
+        self._file.close()
+        return False
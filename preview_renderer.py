@@ -1,60 +1,534 @@
 from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+import io
+import math
 import os
+import struct
+import zlib
+import numpy as np
 
-def render_qr_preview(matrix: list, output_path: str, scale: int = 64, border: int = 2, object_type: str = "SmallProtectiveCase", spacing: float = 1.0):
+from config import CONFIG
+
+from qr_generator import OBJECT_CLASS_MAP, MERGEABLE_OBJECTS, decompose_squares
+
+# Bump whenever preview output changes so cached builds are re-rendered
+RENDERER_VERSION = 2
+
+THUMBNAIL_DIR = os.path.join("assets", "thumbnails")
+THUMBNAIL_VARIANT_CACHE_SIZE = 64  # (object, cell size) pairs kept pre-resized
+
+_atlas = None  # normalized name -> full-size RGBA thumbnail
+
+def _normalize(name: str) -> str:
+    return name.lower()
+
+def _load_atlas() -> dict:
+    """
+    Load every thumbnail once. Keys are case-insensitive (JerryCan == Jerrycan) and
+    in-game class names from OBJECT_CLASS_MAP resolve to the same thumbnail.
+    """
+    global _atlas
+    if _atlas is not None:
+        return _atlas
+
+    atlas = {}
+    if os.path.isdir(THUMBNAIL_DIR):
+        for filename in sorted(os.listdir(THUMBNAIL_DIR)):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() != ".png":
+                continue
+            try:
+                with Image.open(os.path.join(THUMBNAIL_DIR, filename)) as thumb:
+                    atlas[_normalize(name)] = thumb.convert("RGBA")
+            except Exception as e:
+                print(f"[preview_renderer] ⚠️ Could not load thumbnail {filename}: {e}")
+
+    for object_type, class_name in OBJECT_CLASS_MAP.items():
+        key = _normalize(object_type)
+        if key in atlas:
+            atlas.setdefault(_normalize(class_name), atlas[key])
+
+    _atlas = atlas
+    return _atlas
+
+def preload_assets():
+    """
+    Warm the thumbnail atlas and font so no build pays the load cost.
+    """
+    _load_atlas()
+    _get_font()
+
+@lru_cache(maxsize=THUMBNAIL_VARIANT_CACHE_SIZE)
+def get_thumbnail(object_type: str, size: int) -> Image.Image:
+    """
+    Returns the object thumbnail resized to size x size (RGBA). Shared, do not mutate.
+    """
+    source = _load_atlas().get(_normalize(object_type))
+    if source is None:
+        print(f"[preview_renderer] ⚠️ Thumbnail not found for {object_type} — using fallback.")
+        return Image.new("RGBA", (size, size), "black")
+
+    thumb = source.resize((size, size))
+
+    # Optional: rotate certain objects for clarity
+    if object_type.lower() == "doortestkit":
+        thumb = thumb.rotate(90, expand=True)
+    return thumb
+
+@lru_cache(maxsize=1)
+def _get_font():
+    try:
+        return ImageFont.truetype("arial.ttf", 14)
+    except OSError:
+        return ImageFont.load_default()
+
+GRID_COLOR = (0xCC, 0xCC, 0xCC)
+
+@lru_cache(maxsize=THUMBNAIL_VARIANT_CACHE_SIZE)
+def _cell_tile(object_type: str, scale: int) -> np.ndarray:
+    """
+    One dark cell as pixels: the thumbnail alpha-composited onto the white background.
+    Every dark cell of a preview is an identical copy of this tile.
+    """
+    thumb = get_thumbnail(object_type, scale)
+    tile = Image.new("RGB", (scale, scale), "white")
+    tile.paste(thumb, (0, 0), mask=thumb if thumb.mode == "RGBA" else None)
+    tile_array = np.asarray(tile)
+    tile_array.flags.writeable = False
+    return tile_array
+
+def _composite_blocks(canvas: np.ndarray, blocks: tuple, object_type: str, scale: int, border: int, top: int = None):
+    """
+    Draws merged k x k blocks (from decompose_squares()) as one k-times larger thumbnail,
+    replacing the grid lines inside the block, then closes the block outline.
+    top is the canvas y of module row 0 (default: border * scale); blocks reaching past
+    the canvas edge are clipped, so strips can be drawn independently.
+    """
+    top = border * scale if top is None else top
+    height = canvas.shape[0]
+    for row, col, size in zip(*(values.tolist() for values in blocks)):
+        y = top + row * scale
+        x = (border + col) * scale
+        extent = size * scale
+        y_lo, y_hi = max(y, 0), min(y + extent, height)
+        if y_lo >= min(y + extent + 1, height):
+            continue
+        if y_lo < y_hi:
+            canvas[y_lo:y_hi, x:x + extent] = _cell_tile(object_type, extent)[y_lo - y:y_hi - y]
+        if 0 <= y < height:
+            canvas[y, x:x + extent + 1] = GRID_COLOR
+        canvas[y_lo:min(y + extent + 1, height), x] = GRID_COLOR
+
+def merged_blocks(mask: np.ndarray) -> tuple:
+    """
+    (single-cell mask, blocks) for the "merged" layout mode, matching build_layout().
+    """
+    rows, cols, sizes = decompose_squares(mask)
+    single = sizes == 1
+    singles = np.zeros_like(mask, dtype=bool)
+    singles[rows[single], cols[single]] = True
+    return singles, (rows[~single], cols[~single], sizes[~single])
+
+# ✅ Supported preview formats: Pillow format, file extension, quality ladder tried under a byte budget
+# (for PNG the ladder is zlib level; level 9 also enables Pillow's optimize pass)
+PREVIEW_FORMATS = {
+    "png": ("PNG", ".png", [6, 9]),
+    "webp": ("WEBP", ".webp", [90, 80, 65, 50]),
+    "jpeg": ("JPEG", ".jpg", [90, 80, 65, 50])
+}
+
+# Encoder dimension limits (WebP caps at 16383px per side)
+MAX_PREVIEW_DIMENSION = {"png": 65535, "webp": 16383, "jpeg": 65535}
+
+# Cell sizes tried (largest first) when a preview does not fit its byte budget
+BUDGET_CELL_SIZES = [64, 48, 32, 24, 16, 12, 8]
+
+# ✅ Memory ceiling for pixel buffers. PNG previews larger than this are rendered and
+# encoded strip by strip; WebP/JPEG need the whole image, so their cell size is lowered instead.
+PREVIEW_MEMORY_LIMIT = int(CONFIG["preview_memory_limit_mb"] * 1024 * 1024)
+PREVIEW_MAX_SIDE = CONFIG["preview_max_side"]  # cell size is lowered past this many pixels per side
+MIN_CELL_SIZE = 4
+
+# numpy canvas (3 bytes/px) + Pillow's RGB image (4 bytes/px) for a full in-memory render
+FULL_RENDER_BYTES_PER_PIXEL = 7
+
+def preview_path_for(output_path: str, fmt: str = None) -> str:
+    """
+    Swap the preview file extension to match the chosen format.
+    """
+    if not fmt:
+        return output_path
+    return os.path.splitext(output_path)[0] + PREVIEW_FORMATS[fmt][1]
+
+def _track_peak(stats: dict, nbytes: int):
+    if stats is not None:
+        stats["peak_memory_bytes"] = max(stats.get("peak_memory_bytes", 0), int(nbytes))
+
+def _full_render_bytes(mask: np.ndarray, scale: int, border: int) -> int:
+    rows, cols = mask.shape
+    return (rows + border * 2) * (cols + border * 2) * scale * scale * FULL_RENDER_BYTES_PER_PIXEL
+
+def _max_cell_size(mask: np.ndarray, scale: int, border: int, fmt: str) -> int:
+    """
+    Largest usable cell size: capped by PREVIEW_MAX_SIDE and the encoder's dimension limit,
+    and for formats that cannot be streamed (WebP/JPEG) by PREVIEW_MEMORY_LIMIT.
+    """
+    rows, cols = mask.shape
+    side = max(rows, cols) + border * 2
+    cell = min(scale, PREVIEW_MAX_SIDE // side, MAX_PREVIEW_DIMENSION[fmt or "png"] // side)
+    if fmt in ("webp", "jpeg"):
+        area = (rows + border * 2) * (cols + border * 2)
+        cell = min(cell, math.isqrt(PREVIEW_MEMORY_LIMIT // (area * FULL_RENDER_BYTES_PER_PIXEL)))
+    cell = max(cell, MIN_CELL_SIZE)
+    if cell < scale:
+        print(f"[preview_renderer] Lowering cell size {scale}px -> {cell}px for a {rows}x{cols} preview")
+    return cell
+
+def _render_rows(mask: np.ndarray, scale: int, border: int, object_type: str, first: int, last: int, blocks: tuple = None) -> np.ndarray:
+    """
+    Pixels of image rows [first, last) in cell units (row 0 is the top border), as an
+    (n * scale, width, 3) array. Rendering all rows at once equals the full preview;
+    rendering them in strips keeps only one strip in memory.
+    """
+    rows, cols = mask.shape
+    width = (cols + border * 2) * scale
+    canvas = np.full(((last - first) * scale, width, 3), 255, dtype=np.uint8)
+    x0 = border * scale
+
+    m0, m1 = max(first - border, 0), min(last - border, rows)
+    if m0 < m1:
+        y0 = (m0 + border - first) * scale
+        band = canvas[y0:y0 + (m1 - m0) * scale]
+        cells = band[:, x0:x0 + cols * scale].reshape(m1 - m0, scale, cols, scale, 3)
+        cells.transpose(0, 2, 1, 3, 4)[mask[m0:m1]] = _cell_tile(object_type, scale)
+        band[:, x0:x0 + cols * scale + 1:scale] = GRID_COLOR
+        band[::scale, x0:x0 + cols * scale + 1] = GRID_COLOR
+
+    # Closing bottom edge of the grid (top line of the first bottom-border row)
+    closing = border + rows - first
+    if 0 <= closing < last - first:
+        canvas[closing * scale, x0:x0 + cols * scale + 1] = GRID_COLOR
+
+    if blocks is not None:
+        _composite_blocks(canvas, blocks, object_type, scale, border, top=(border - first) * scale)
+    return canvas
+
+def _draw_label(img: Image.Image, image_height: int, object_type: str, spacing: float, y_offset: int = 0):
+    # Optional footer text for object type and spacing
+    draw = ImageDraw.Draw(img)
+    font = _get_font()
+    label_text = f"Object: {object_type} | Spacing: {spacing}"
+    draw.text((10, image_height - 24 - y_offset), label_text, fill="black", font=font)
+
+def _draw_preview(mask: np.ndarray, scale: int, border: int, object_type: str, spacing: float, blocks: tuple = None) -> Image.Image:
+    rows, cols = mask.shape
+    img_height = (rows + border * 2) * scale
+
+    canvas = _render_rows(mask, scale, border, object_type, 0, rows + border * 2, blocks)
+    img = Image.fromarray(canvas, "RGB")
+    _draw_label(img, img_height, object_type, spacing)
+    return img
+
+def _png_chunk(tag: bytes, data) -> bytes:
+    return struct.pack(">I", len(data)) + tag + bytes(data) + struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF)
+
+def _iter_strips(mask: np.ndarray, scale: int, border: int, object_type: str, spacing: float, blocks: tuple, strip_cells: int, stats: dict = None):
+    """
+    Yields (y, pixels) strips of strip_cells image rows with the footer label applied.
+    """
+    rows, cols = mask.shape
+    total = rows + border * 2
+    img_height = total * scale
+    for first in range(0, total, strip_cells):
+        strip = _render_rows(mask, scale, border, object_type, first, min(first + strip_cells, total), blocks)
+        y = first * scale
+        if y + strip.shape[0] > img_height - 40:
+            img = Image.fromarray(strip, "RGB")
+            _draw_label(img, img_height, object_type, spacing, y_offset=y)
+            strip = np.asarray(img)
+        _track_peak(stats, strip.nbytes * 3)
+        yield y, strip
+
+def _strip_cells_for(mask: np.ndarray, scale: int, border: int) -> int:
+    width = (mask.shape[1] + border * 2) * scale
+    # strip + filtered copy + label image must stay under the ceiling
+    return max(1, PREVIEW_MEMORY_LIMIT // (4 * scale * width * 3))
+
+def _write_png_strips(f, mask: np.ndarray, scale: int, border: int, object_type: str, spacing: float, blocks: tuple = None, level: int = 6, stats: dict = None):
+    """
+    Streams an RGB PNG: each strip is Sub-filtered with NumPy and fed through one zlib
+    stream, emitting IDAT chunks as compressed data becomes available.
+    """
+    rows, cols = mask.shape
+    width = (cols + border * 2) * scale
+    height = (rows + border * 2) * scale
+
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+    compressor = zlib.compressobj(level)
+    for _, strip in _iter_strips(mask, scale, border, object_type, spacing, blocks, _strip_cells_for(mask, scale, border), stats):
+        flat = strip.reshape(strip.shape[0], width * 3)
+        filtered = np.empty((flat.shape[0], width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = 1  # Sub: byte minus the same channel of the previous pixel
+        filtered[:, 1:4] = flat[:, :3]
+        np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+        data = compressor.compress(filtered)
+        if data:
+            f.write(_png_chunk(b"IDAT", data))
+    f.write(_png_chunk(b"IDAT", compressor.flush()))
+    f.write(_png_chunk(b"IEND", b""))
+
+def _encode(img: Image.Image, fmt: str, quality: int = None) -> bytes:
+    pil_format = PREVIEW_FORMATS[fmt][0]
+    buffer = io.BytesIO()
+    if fmt == "png":
+        img.save(buffer, pil_format, compress_level=quality, optimize=quality >= 9)
+    elif fmt == "webp":
+        img.save(buffer, pil_format, quality=quality, method=4)
+    else:
+        img.save(buffer, pil_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def _streams(mask: np.ndarray, scale: int, border: int, fmt: str) -> bool:
+    return fmt == "png" and _full_render_bytes(mask, scale, border) > PREVIEW_MEMORY_LIMIT
+
+class _Renderer:
+    """
+    Encodes one (mask, cell size) either from a full in-memory image, reused across
+    qualities, or strip by strip when the image would exceed PREVIEW_MEMORY_LIMIT.
+    """
+
+    def __init__(self, mask, scale, border, object_type, spacing, fmt, blocks, stats):
+        self.args = (mask, scale, border, object_type, spacing)
+        self.fmt = fmt
+        self.blocks = blocks
+        self.stats = stats
+        self.streamed = _streams(mask, scale, border, fmt)
+        self.img = None
+
+    def encode(self, quality) -> bytes:
+        mask, scale, border, object_type, spacing = self.args
+        if self.streamed:
+            buffer = io.BytesIO()
+            _write_png_strips(buffer, mask, scale, border, object_type, spacing, self.blocks, quality, self.stats)
+            _track_peak(self.stats, buffer.tell())
+            return buffer.getvalue()
+        if self.img is None:
+            self.img = _draw_preview(mask, scale, border, object_type, spacing, self.blocks)
+        data = _encode(self.img, self.fmt, quality)
+        _track_peak(self.stats, _full_render_bytes(mask, scale, border) + len(data))
+        return data
+
+def _encode_within_budget(mask: np.ndarray, scale: int, border: int, object_type: str, spacing: float, fmt: str, max_bytes: int, blocks: tuple = None, stats: dict = None) -> tuple:
+    """
+    Returns (data, cell_size) for the largest-cell, highest-quality encoding that fits max_bytes.
+
+    Encoded size scales roughly with pixel area, so a cheap probe render at a small
+    cell size gives bytes-per-pixel, which predicts the largest cell size likely to fit.
+    Large previews are therefore encoded about once instead of once per ladder step.
+    Lower qualities are only tried when an encoding is already close to the budget.
+    If nothing fits, the smallest attempt is returned.
+    """
+    rows, cols = mask.shape
+    pixels_per_cell = (rows + border * 2) * (cols + border * 2)
+    max_cell = _max_cell_size(mask, scale, border, fmt)
+    ladder = [max_cell] + [size for size in BUDGET_CELL_SIZES if size < max_cell]
+    qualities = PREVIEW_FORMATS[fmt][2]
+
+    probe_cell = ladder[-1] if len(ladder) > 2 else max_cell
+    probe = _Renderer(mask, probe_cell, border, object_type, spacing, fmt, blocks, stats).encode(qualities[0])
+    bytes_per_pixel = len(probe) / (pixels_per_cell * probe_cell * probe_cell)
+
+    data, data_cell = probe, probe_cell
+    for cell_size in ladder:
+        if cell_size != probe_cell and bytes_per_pixel * pixels_per_cell * cell_size * cell_size > max_bytes * 1.1:
+            continue
+        renderer = _Renderer(mask, cell_size, border, object_type, spacing, fmt, blocks, stats)
+        for quality in qualities:
+            data = probe if cell_size == probe_cell and quality == qualities[0] else renderer.encode(quality)
+            data_cell = cell_size
+            if len(data) <= max_bytes:
+                return data, data_cell
+            if len(data) > max_bytes * 1.5:
+                break
+        bytes_per_pixel = max(bytes_per_pixel, len(data) / (pixels_per_cell * cell_size * cell_size))
+
+    print(f"[preview_renderer] ⚠️ Preview could not fit {max_bytes} bytes; using smallest encoding ({len(data)} bytes)")
+    return data, data_cell
+
+def render_preview(matrix: list, output_path: str, scale: int = 64, border: int = 2, object_type: str = "SmallProtectiveCase", spacing: float = 1.0, fmt: str = None, max_bytes: int = None, layout_mode: str = "grid") -> dict:
     """
-    Renders a PNG preview of the QR object layout using thumbnails with grid overlay.
+    Renders a preview of the QR object layout using thumbnails with grid overlay.
 
     Parameters:
     - matrix: 2D list from generate_qr_matrix()
     - output_path: where to save the image (can be per-guild)
-    - scale: pixel size per QR unit (default 64px for thumbnails)
+    - scale: pixel size per QR unit (default 64px for thumbnails); lowered automatically
+      past PREVIEW_MAX_SIDE, and for WebP/JPEG past PREVIEW_MEMORY_LIMIT
     - border: empty border (in matrix units)
     - object_type: name of the DayZ object (matches thumbnail PNG)
     - spacing: shown in preview text for visual confirmation
+    - fmt: "png", "webp" or "jpeg"; None keeps the plain PNG save
+    - max_bytes: byte budget; cell size and quality are lowered until the file fits
+    - layout_mode: "merged" draws merged blocks as one large thumbnail, as they will spawn
+
+    PNG previews whose pixels would exceed PREVIEW_MEMORY_LIMIT are streamed strip by strip.
+    Returns {"path", "data", "cell_size", "width", "height", "bytes", "streamed", "peak_memory_bytes"};
+    data is the encoded image (None when streamed to disk) and peak memory counts the
+    pixel and encoder buffers held at once.
     """
-    rows = len(matrix)
-    cols = len(matrix[0])
+    mask = np.asarray(matrix, dtype=bool)
+    output_path = preview_path_for(output_path, fmt)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    stats = {"peak_memory_bytes": 0}
 
-    img_width = (cols + border * 2) * scale
-    img_height = (rows + border * 2) * scale
+    blocks = None
+    if layout_mode == "merged" and object_type in MERGEABLE_OBJECTS:
+        mask, blocks = merged_blocks(mask)
 
-    img = Image.new("RGB", (img_width, img_height), "white")
-    draw = ImageDraw.Draw(img)
+    if fmt is None and max_bytes is None:
+        cell_size = _max_cell_size(mask, scale, border, None)
+        streamed = _streams(mask, cell_size, border, "png")
+        data = None
+        if streamed:
+            with open(output_path, "wb") as f:
+                _write_png_strips(f, mask, cell_size, border, object_type, spacing, blocks, stats=stats)
+        else:
+            buffer = io.BytesIO()
+            _draw_preview(mask, cell_size, border, object_type, spacing, blocks).save(buffer, "PNG")
+            _track_peak(stats, _full_render_bytes(mask, cell_size, border))
+            data = buffer.getvalue()
+            with open(output_path, "wb") as f:
+                f.write(data)
+    else:
+        fmt = fmt or "png"
+        if max_bytes:
+            data, cell_size = _encode_within_budget(mask, scale, border, object_type, spacing, fmt, max_bytes, blocks, stats)
+        else:
+            cell_size = _max_cell_size(mask, scale, border, fmt)
+            data = _Renderer(mask, cell_size, border, object_type, spacing, fmt, blocks, stats).encode(PREVIEW_FORMATS[fmt][2][0])
+        streamed = _streams(mask, cell_size, border, fmt)
+        with open(output_path, "wb") as f:
+            f.write(data)
 
-    thumbnail_name = object_type + ".PNG"
-    thumb_path = os.path.join("assets", "thumbnails", thumbnail_name)
+    rows, cols = mask.shape
+    print(f"✅ Saved QR preview to {output_path}")
+    return {
+        "path": output_path,
+        "data": data,
+        "cell_size": cell_size,
+        "width": (cols + border * 2) * cell_size,
+        "height": (rows + border * 2) * cell_size,
+        "bytes": os.path.getsize(output_path),
+        "streamed": streamed,
+        "peak_memory_bytes": stats["peak_memory_bytes"]
+    }
 
-    try:
-        thumb = Image.open(thumb_path).convert("RGBA").resize((scale, scale))
+def render_qr_preview(matrix: list, output_path: str, scale: int = 64, border: int = 2, object_type: str = "SmallProtectiveCase", spacing: float = 1.0, fmt: str = None, max_bytes: int = None, layout_mode: str = "grid") -> str:
+    """
+    render_preview() returning only the path actually written (extension follows fmt).
+    """
+    return render_preview(matrix, output_path, scale, border, object_type, spacing, fmt, max_bytes, layout_mode)["path"]
+
+# ✅ Deep Zoom (DZI) tile pyramid for the web gallery's zoomable viewer
+DZI_TILE_SIZE = 256
+
+def render_tile_pyramid(matrix: list, output_path: str, cell_size: int = 32, border: int = 2, object_type: str = "SmallProtectiveCase", spacing: float = 1.0, layout_mode: str = "grid") -> dict:
+    """
+    Writes a Deep Zoom pyramid: output_path (.dzi descriptor) plus <name>_files/<level>/<col>_<row>.png.
 
-        # Optional: rotate certain objects for clarity
-        if object_type.lower() == "doortestkit":
-            thumb = thumb.rotate(90, expand=True)
+    The full-resolution level is rendered in strips one tile high, so memory stays at one
+    strip; every lower level is built from at most four tiles of the level above.
+    cell_size must divide DZI_TILE_SIZE so tile edges fall on module boundaries.
+    Returns {"path", "levels", "tiles", "width", "height"}.
+    """
+    if DZI_TILE_SIZE % cell_size:
+        raise ValueError(f"cell_size must divide {DZI_TILE_SIZE}")
 
-    except Exception as e:
-        print(f"[preview_renderer] ⚠️ Thumbnail not found: {thumb_path} — using fallback. Error: {e}")
-        thumb = Image.new("RGBA", (scale, scale), "black")
+    mask = np.asarray(matrix, dtype=bool)
+    blocks = None
+    if layout_mode == "merged" and object_type in MERGEABLE_OBJECTS:
+        mask, blocks = merged_blocks(mask)
 
-    for r in range(rows):
-        for c in range(cols):
-            x = (c + border) * scale
-            y = (r + border) * scale
-            if matrix[r][c]:
-                img.paste(thumb, (x, y), mask=thumb if thumb.mode == "RGBA" else None)
+    rows, cols = mask.shape
+    width = (cols + border * 2) * cell_size
+    height = (rows + border * 2) * cell_size
+    max_level = math.ceil(math.log2(max(width, height)))
+    tiles_dir = os.path.splitext(output_path)[0] + "_files"
+    tile_count = 0
 
-            # Draw a light border for each cell
-            draw.rectangle([x, y, x + scale, y + scale], outline="#cccccc", width=1)
+    def tile_path(level, col, row):
+        return os.path.join(tiles_dir, str(level), f"{col}_{row}.png")
 
-    # Optional footer text for object type and spacing
-    try:
-        font = ImageFont.truetype("arial.ttf", 14)
-    except:
-        font = ImageFont.load_default()
+    os.makedirs(os.path.join(tiles_dir, str(max_level)), exist_ok=True)
+    for y, strip in _iter_strips(mask, cell_size, border, object_type, spacing, blocks, DZI_TILE_SIZE // cell_size):
+        for x in range(0, width, DZI_TILE_SIZE):
+            Image.fromarray(strip[:, x:x + DZI_TILE_SIZE], "RGB").save(
+                tile_path(max_level, x // DZI_TILE_SIZE, y // DZI_TILE_SIZE), compress_level=6
+            )
+            tile_count += 1
 
-    label_text = f"Object: {object_type} | Spacing: {spacing}"
-    draw.text((10, img_height - 24), label_text, fill="black", font=font)
+    level_width, level_height = width, height
+    for level in range(max_level - 1, -1, -1):
+        child_cols = math.ceil(level_width / DZI_TILE_SIZE)
+        child_rows = math.ceil(level_height / DZI_TILE_SIZE)
+        level_width, level_height = math.ceil(level_width / 2), math.ceil(level_height / 2)
+        os.makedirs(os.path.join(tiles_dir, str(level)), exist_ok=True)
+        for row in range(math.ceil(level_height / DZI_TILE_SIZE)):
+            for col in range(math.ceil(level_width / DZI_TILE_SIZE)):
+                region = Image.new("RGB", (DZI_TILE_SIZE * 2, DZI_TILE_SIZE * 2), "white")
+                region_width = region_height = 0
+                for dy in (0, 1):
+                    for dx in (0, 1):
+                        child_col, child_row = col * 2 + dx, row * 2 + dy
+                        if child_col >= child_cols or child_row >= child_rows:
+                            continue
+                        with Image.open(tile_path(level + 1, child_col, child_row)) as child:
+                            region.paste(child, (dx * DZI_TILE_SIZE, dy * DZI_TILE_SIZE))
+                            region_width = max(region_width, dx * DZI_TILE_SIZE + child.width)
+                            region_height = max(region_height, dy * DZI_TILE_SIZE + child.height)
+                region.crop((0, 0, region_width, region_height)).reduce(2).save(tile_path(level, col, row), compress_level=6)
+                tile_count += 1
+
+    with open(output_path, "w") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{DZI_TILE_SIZE}" Overlap="0" Format="png">'
+            f'<Size Width="{width}" Height="{height}"/></Image>\n'
+        )
+
+    print(f"[preview_renderer] ✅ Wrote {tile_count} pyramid tiles ({max_level + 1} levels) to {tiles_dir}")
+    return {"path": output_path, "levels": max_level + 1, "tiles": tile_count, "width": width, "height": height}
+
+# ✅ Contact sheet for batch builds: one captioned thumbnail per build
+CONTACT_SHEET_THUMB = 256
+CONTACT_SHEET_CAPTION = 20
+
+def render_contact_sheet(preview_paths: list, captions: list, output_path: str, thumb_size: int = CONTACT_SHEET_THUMB, columns: int = None) -> str:
+    """
+    Tiles previews into one PNG grid with a caption under each. Missing previews
+    (failed builds) leave a blank cell so positions still match the batch rows.
+    Previews are opened and downsampled one at a time.
+    """
+    count = len(preview_paths)
+    columns = columns or max(1, min(count, math.ceil(math.sqrt(count))))
+    cell_height = thumb_size + CONTACT_SHEET_CAPTION
+    sheet = Image.new("RGB", (columns * thumb_size, math.ceil(count / columns) * cell_height), "white")
+    draw = ImageDraw.Draw(sheet)
+    font = _get_font()
+
+    for index, (path, caption) in enumerate(zip(preview_paths, captions)):
+        x = (index % columns) * thumb_size
+        y = (index // columns) * cell_height
+        if path and os.path.exists(path):
+            with Image.open(path) as preview:
+                preview.draft("RGB", (thumb_size, thumb_size))
+                thumb = preview.convert("RGB")
+            thumb.thumbnail((thumb_size - 8, thumb_size - 8))
+            sheet.paste(thumb, (x + (thumb_size - thumb.width) // 2, y + (thumb_size - thumb.height) // 2))
+        draw.text((x + 4, y + thumb_size + 2), caption, fill="black", font=font)
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    img.save(output_path)
-    print(f"✅ Saved QR preview to {output_path}")
+    sheet.save(output_path, optimize=True)
+    print(f"✅ Saved contact sheet ({count} builds) to {output_path}")
+    return output_path
@@ -0,0 +1,240 @@
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+from pyzbar.pyzbar import decode, ZBarSymbol
+
+from config import CONFIG
+
+MAX_IMAGE_BYTES = int(CONFIG["decode_max_mb"] * 1024 * 1024)
+MAX_IMAGE_PIXELS = CONFIG["decode_max_pixels"]
+DECODE_TARGET_SIDE = CONFIG["decode_target_side"]  # first pass runs at roughly this long side
+MAX_CODES = CONFIG["decode_max_codes"]  # distinct codes returned per image (one layout each)
+MAX_FRAMES = CONFIG["decode_max_frames"]  # GIF / TIFF frames decoded
+DECODE_WORKERS = min(4, os.cpu_count() or 1)  # frames decoded in parallel (cv2 / zbar release the GIL)
+
+# cv2.imdecode can decode JPEG directly at 1/2, 1/4 or 1/8 size (DCT scaling), much cheaper than a full decode
+REDUCED_GRAYSCALE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+]
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_IMAGE_BYTES or MAX_IMAGE_PIXELS."""
+
+
+def image_size(img_bytes: bytes) -> tuple | None:
+    """
+    (width, height) from the image header without decoding pixels, or None if unreadable.
+    """
+    try:
+        with Image.open(io.BytesIO(img_bytes)) as img:
+            return img.size
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError("Image dimensions are too large to decode.")
+    except Exception:
+        return None
+
+
+def check_image_limits(img_bytes: bytes, size: tuple = None):
+    """
+    Raises ImageTooLargeError for uploads over the byte or pixel limits.
+    """
+    if len(img_bytes) > MAX_IMAGE_BYTES:
+        raise ImageTooLargeError(f"Image is {len(img_bytes) / 1024 / 1024:.1f} MB; the limit is {MAX_IMAGE_BYTES // 1024 // 1024} MB.")
+    size = size or image_size(img_bytes)
+    if size and size[0] * size[1] > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image is {size[0]}x{size[1]} pixels; the limit is {MAX_IMAGE_PIXELS // 1_000_000} megapixels.")
+
+
+def _reduction_for(size: tuple) -> tuple:
+    """
+    (factor, imread flag) for the largest reduction that keeps the long side >= DECODE_TARGET_SIDE.
+    """
+    if size:
+        for factor, flag in REDUCED_GRAYSCALE_FLAGS:
+            if max(size) // factor >= DECODE_TARGET_SIDE:
+                return factor, flag
+    return 1, cv2.IMREAD_GRAYSCALE
+
+
+def _reading_order(found: list) -> list:
+    """
+    found: (left, top, height, text) per code. Returns texts top-to-bottom, left-to-right,
+    treating codes whose tops differ by less than half a code height as one row.
+    """
+    if not found:
+        return []
+    band = max(max(height for _, _, height, _ in found) / 2, 1)
+    return [text for _, _, _, text in sorted(found, key=lambda item: (round(item[1] / band), item[0]))]
+
+
+def _zbar(gray: np.ndarray) -> list:
+    return _reading_order([
+        (symbol.rect.left, symbol.rect.top, symbol.rect.height, symbol.data.decode("utf-8", errors="replace"))
+        for symbol in decode(gray, symbols=[ZBarSymbol.QRCODE])
+    ])
+
+
+def _otsu(gray: np.ndarray) -> list:
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return _zbar(binary)
+
+
+def _adaptive(gray: np.ndarray) -> list:
+    # Block size ~1/20 of the image handles uneven lighting (screen glare, shadows across a print);
+    # the mean (box filter) variant costs the same for any block size, a Gaussian this wide does not
+    block = max(11, (min(gray.shape) // 20) | 1)
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, block, 2)
+    return _zbar(binary)
+
+
+def _cv2_detector(gray: np.ndarray) -> list:
+    found, texts, points, _ = cv2.QRCodeDetector().detectAndDecodeMulti(gray)
+    if not found:
+        return []
+    return _reading_order([
+        (corners[:, 0].min(), corners[:, 1].min(), np.ptp(corners[:, 1]), text)
+        for text, corners in zip(texts, points) if text
+    ])
+
+
+# ✅ Cheapest first; the cascade stops at the first strategy that decodes anything.
+# "reduced" strategies run on the DCT-reduced image, "full" ones on the full-resolution grayscale
+# (only needed for small codes in large photos). OpenCV's detector is ~20x slower than zbar.
+DECODE_STRATEGIES = [
+    ("zbar", "reduced", _zbar),
+    ("otsu", "reduced", _otsu),
+    ("adaptive", "reduced", _adaptive),
+    ("cv2_detector", "reduced", _cv2_detector),
+    ("zbar_full", "full", _zbar),
+    ("adaptive_full", "full", _adaptive),
+    ("cv2_detector_full", "full", _cv2_detector)
+]
+
+
+def _cascade(load, full_differs: bool, strategies: list) -> dict:
+    """
+    load(resolution) -> grayscale array or None. Returns {"texts", "strategy", "timings"}.
+    """
+    images = {}
+    timings = {}
+    for name, resolution, strategy in strategies:
+        if resolution == "full" and not full_differs:
+            continue
+        start = time.perf_counter()
+        if resolution not in images:
+            images[resolution] = load(resolution)
+        gray = images[resolution]
+        texts = strategy(gray) if gray is not None else []
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        if gray is None:
+            break
+        if texts:
+            return {"texts": texts, "strategy": name, "timings": timings}
+    return {"texts": [], "strategy": None, "timings": timings}
+
+
+def _frame_loader(frame: np.ndarray):
+    # Animated/multi-page frames are already decoded; "reduced" is an area resize
+    factor = max(frame.shape) / DECODE_TARGET_SIDE
+
+    def load(resolution):
+        if resolution == "full" or factor <= 1:
+            return frame
+        return cv2.resize(frame, (round(frame.shape[1] / factor), round(frame.shape[0] / factor)), interpolation=cv2.INTER_AREA)
+
+    return load, factor > 1
+
+
+def _read_frames(img_bytes: bytes, size: tuple) -> list:
+    """
+    Grayscale frames of an animated GIF / multi-page TIFF (at most MAX_FRAMES), or [] for single images.
+    """
+    try:
+        with Image.open(io.BytesIO(img_bytes)) as img:
+            count = getattr(img, "n_frames", 1)
+            if count <= 1:
+                return []
+            if count > MAX_FRAMES:
+                print(f"[qr_decoder] ⚠️ Image has {count} frames; decoding the first {MAX_FRAMES}")
+            check_image_limits(img_bytes, (size[0] * min(count, MAX_FRAMES), size[1]))
+            frames = []
+            for index in range(min(count, MAX_FRAMES)):
+                img.seek(index)
+                frames.append(np.asarray(img.convert("L")))
+            return frames
+    except ImageTooLargeError:
+        raise
+    except Exception:
+        return []
+
+
+def _unique(texts: list) -> list:
+    return list(dict.fromkeys(texts))[:MAX_CODES]
+
+
+def decode_qr_details(img_bytes: bytes, strategies: list = None) -> dict:
+    """
+    Runs the decode cascade on every frame and reports how it went.
+
+    Returns {"texts", "text", "strategy", "frames", "reduction", "size", "timings"}:
+    texts are the distinct payloads in reading order (frame by frame), at most MAX_CODES;
+    text is the first one or None. strategy and timings (strategy name -> milliseconds,
+    including image decoding) describe the first frame. Multi-frame images are decoded
+    frame by frame in parallel. Full-resolution strategies are skipped when the first
+    pass already ran unreduced.
+    Raises ImageTooLargeError for uploads over the configured limits.
+    """
+    strategies = strategies or DECODE_STRATEGIES
+    size = image_size(img_bytes)
+    check_image_limits(img_bytes, size)
+    frames = _read_frames(img_bytes, size) if size else []
+
+    if frames:
+        with ThreadPoolExecutor(max_workers=min(DECODE_WORKERS, len(frames))) as pool:
+            results = list(pool.map(lambda frame: _cascade(*_frame_loader(frame), strategies), frames))
+        factor = 1
+    else:
+        factor, flag = _reduction_for(size)
+        np_array = np.frombuffer(img_bytes, np.uint8)
+        results = [_cascade(
+            lambda resolution: cv2.imdecode(np_array, flag if resolution == "reduced" else cv2.IMREAD_GRAYSCALE),
+            factor > 1,
+            strategies
+        )]
+
+    texts = _unique([text for result in results for text in result["texts"]])
+    return {
+        "texts": texts,
+        "text": texts[0] if texts else None,
+        "strategy": results[0]["strategy"],
+        "frames": len(results),
+        "reduction": factor,
+        "size": size,
+        "timings": results[0]["timings"]
+    }
+
+
+def decode_qr_image(img_bytes: bytes) -> str | None:
+    """
+    Decodes the first QR code found in an uploaded image.
+    Returns the payload text, or None when nothing could be read.
+    Raises ImageTooLargeError for uploads over the configured limits.
+    """
+    return decode_qr_details(img_bytes)["text"]
+
+
+def decode_qr_codes(img_bytes: bytes) -> list:
+    """
+    Every distinct QR payload in an image, across all frames of animated GIFs and
+    multi-page TIFFs, in reading order (at most MAX_CODES). Empty when nothing could be read.
+    Raises ImageTooLargeError for uploads over the configured limits.
+    """
+    return decode_qr_details(img_bytes)["texts"]
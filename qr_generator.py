@@ -1,7 +1,22 @@
-import os
 import qrcode
 import json
 import random
+import numpy as np
+
+from object_serializer import write_object_json
+
+# Optional symbologies: Micro QR via segno, rectangular Micro QR (rMQR) via rmqrcode
+try:
+    import segno
+except ImportError:
+    segno = None
+
+try:
+    from rmqrcode import rMQR, ErrorCorrectionLevel, DataTooLongError
+    from rmqrcode.format.rmqr_versions import rMQRVersions
+    from rmqrcode.segments import SegmentOptimizer
+except ImportError:
+    rMQR = None
 
 # ✅ In-game object class mapping
 OBJECT_CLASS_MAP = {
@@ -32,21 +47,350 @@ OBJECT_SIZE_ADJUSTMENTS = {
 }
 
 MAX_OBJECTS = 950  # ⬆️ Increased object cap
+MAX_TILED_OBJECTS = 177 * 177  # Tiled exports: any code up to version 40 (177x177)
+
+# ✅ Error correction levels, weakest (fewest modules) first
+ERROR_CORRECTION_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H
+}
+
+# Encoding modes: "mixed" lets qrcode split the text into numeric/alphanumeric/byte
+# segments, "byte" encodes everything as a single 8-bit segment
+ENCODING_MODES = {"mixed": 20, "byte": 0}
+
+# Object minimization: "off" keeps qrcode's own mask choice, "mask" picks the mask with
+# the fewest dark modules, "mask_ecc" also compares error correction levels of the same size
+MINIMIZE_MODES = ("off", "mask", "mask_ecc")
 
-def generate_qr_matrix(data: str, box_size: int = 1) -> list:
+# Masks scoring worse than this multiple of the best mask penalty are never chosen,
+# so minimizing objects cannot select a pattern with large blocks or finder-like runs
+MASK_PENALTY_TOLERANCE = 1.5
+
+class QRCapacityError(ValueError):
+    """Raised when no QR version / error correction / mode combination fits the object budget."""
+
+def _make_qr(data: str, error_correction: str, mode: str, version: int = None) -> qrcode.QRCode:
     qr = qrcode.QRCode(
-        version=3,  # ✅ 29x29 matrix
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=box_size,
+        version=version,
+        error_correction=ERROR_CORRECTION_LEVELS[error_correction],
+        box_size=1,
         border=1
     )
-    qr.add_data(data)
-    qr.make(fit=True)
-    return qr.get_matrix()
+    qr.add_data(data, optimize=ENCODING_MODES[mode])
+    return qr
 
-def qr_to_object_list(matrix: list, object_type: str, origin: dict, offset: dict, scale: float = 1.0, spacing: float = None, include_mirror_kit: bool = False) -> list:
-    rows = len(matrix)
-    cols = len(matrix[0])
+def _build_candidate(data: str, error_correction: str, mode: str, version: int, minimize: bool) -> dict:
+    """
+    Builds one QR code. With minimize, all eight masks are evaluated and the one with the
+    fewest dark modules (within MASK_PENALTY_TOLERANCE) wins; otherwise qrcode's choice is kept.
+    """
+    qr = _make_qr(data, error_correction, mode, version)
+    default_mask = qr.best_mask_pattern()
+    qr.makeImpl(False, default_mask)
+    default_dark = sum(map(sum, qr.modules))
+    mask, dark_modules = default_mask, default_dark
+
+    if minimize:
+        scored = []
+        for candidate_mask in range(8):
+            qr.makeImpl(False, candidate_mask)
+            scored.append((sum(map(sum, qr.modules)), qrcode.util.lost_point(qr.modules), candidate_mask))
+        limit = min(penalty for _, penalty, _ in scored) * MASK_PENALTY_TOLERANCE
+        dark_modules, _, mask = min(
+            entry for entry in scored
+            if entry[1] <= limit or entry[2] == default_mask
+        )
+
+    qr.makeImpl(False, mask)
+    return {
+        "version": version,
+        "error_correction": error_correction,
+        "mode": mode,
+        "mask": mask,
+        "matrix": tuple(tuple(row) for row in qr.get_matrix()),
+        "dark_modules": dark_modules,
+        "baseline_dark_modules": default_dark
+    }
+
+def choose_qr_settings(data: str, max_objects: int = MAX_OBJECTS, minimize: str = "off") -> dict:
+    """
+    Finds the smallest QR code for data whose dark-module count fits max_objects.
+
+    Every error correction level x encoding mode is sized with best_fit() (bit counting only),
+    then candidates are built smallest version first; at equal size the stronger error
+    correction wins. Only the candidates that are actually tried get a full matrix build.
+    minimize (see MINIMIZE_MODES) trades the mask and, with "mask_ecc", the error correction
+    level for fewer dark modules without growing the code.
+
+    Returns {"version", "error_correction", "mode", "mask", "matrix", "dark_modules",
+    "baseline_dark_modules"}; the baseline is the count with minimize="off".
+    The matrix is a tuple of tuples (shared by the cache, do not mutate).
+    Raises QRCapacityError when nothing fits.
+    """
+    if minimize not in MINIMIZE_MODES:
+        raise ValueError(f"Unknown minimize mode: {minimize}")
+
+    candidates = []
+    for rank, error_correction in enumerate(ERROR_CORRECTION_LEVELS):
+        for mode in ENCODING_MODES:
+            try:
+                version = _make_qr(data, error_correction, mode).best_fit()
+            except (qrcode.exceptions.DataOverflowError, ValueError):
+                # Longer than version 40 allows (older qrcode releases raise ValueError)
+                continue
+            candidates.append((version, -rank, error_correction, mode))
+
+    if not candidates:
+        raise QRCapacityError(f"Text is too long for a QR code ({len(data)} characters).")
+
+    candidates.sort()
+    smallest_version = candidates[0][0]
+    built = []
+    for version, _, error_correction, mode in candidates:
+        if version > smallest_version:
+            # Dark modules grow with the module count; a larger version will not fit either
+            break
+        qr_code = _build_candidate(data, error_correction, mode, version, minimize != "off")
+        built.append(qr_code)
+        if qr_code["dark_modules"] <= max_objects and minimize != "mask_ecc":
+            return qr_code
+
+    fitting = [qr_code for qr_code in built if qr_code["dark_modules"] <= max_objects]
+    if fitting:
+        # Fewest objects; ties keep the stronger error correction (earlier in the list)
+        best = min(fitting, key=lambda qr_code: qr_code["dark_modules"])
+        return dict(best, baseline_dark_modules=built[0]["baseline_dark_modules"])
+
+    raise QRCapacityError(
+        f"Text needs at least {min(qr_code['dark_modules'] for qr_code in built)} objects "
+        f"(QR version {smallest_version}), but the object budget is {max_objects}. "
+        f"Shorten the text or use a tiled export."
+    )
+
+# ✅ Symbologies: "auto" picks whichever available symbol needs the fewest objects.
+# Micro QR and rMQR are not read by every phone camera app, so "qr" stays the default.
+SYMBOLOGIES = ("qr", "micro", "rmqr", "auto")
+SYMBOLOGY_LABELS = {"qr": "QR", "micro": "Micro QR", "rmqr": "rMQR"}
+
+def _bordered(modules) -> tuple:
+    """
+    Symbol modules (no quiet zone) -> bool matrix with the same 1-module border as QR output.
+    """
+    matrix = np.pad(np.asarray([list(row) for row in modules], dtype=bool), 1)
+    return tuple(map(tuple, matrix.tolist()))
+
+def _micro_candidate(data: str, minimize: str) -> dict | None:
+    """
+    Smallest Micro QR (M1-M4) for data, or None when it does not fit or segno is missing.
+    With minimize, the four Micro QR masks are compared for the fewest dark modules.
+    """
+    if segno is None:
+        return None
+    try:
+        symbol = segno.make_micro(data)
+    except segno.DataOverflowError:
+        return None
+
+    baseline_dark = sum(map(sum, symbol.matrix))
+    if minimize != "off":
+        masked = [
+            segno.make_micro(data, version=symbol.version, error=symbol.error, mask=mask, boost_error=False)
+            for mask in range(4)
+        ]
+        symbol = min(masked, key=lambda candidate: sum(map(sum, candidate.matrix)))
+
+    matrix = _bordered(symbol.matrix)
+    return {
+        "symbology": "micro",
+        "version": symbol.version,
+        "error_correction": symbol.error or "-",  # M1 only detects errors
+        "mode": symbol.mode,
+        "mask": symbol.mask,
+        "matrix": matrix,
+        "dark_modules": sum(map(sum, matrix)),
+        "baseline_dark_modules": baseline_dark
+    }
+
+def _rmqr_candidate(data: str) -> dict | None:
+    """
+    Smallest-area rMQR for data, or None when it does not fit or rmqrcode is missing.
+
+    Versions are tried in order of area and the search stops at the first area that holds
+    the data (rMQR.fit() would optimize segments for all 32 versions per fit strategy).
+    Among equal-area versions the one with the fewest dark modules wins. rMQR has a single fixed mask.
+    """
+    if rMQR is None:
+        return None
+
+    best = None
+    by_area = sorted(rMQRVersions.items(), key=lambda item: item[1]["width"] * item[1]["height"])
+    for version_name, version in by_area:
+        area = version["width"] * version["height"]
+        if best is not None and area > best["area"]:
+            break
+        try:
+            segments = SegmentOptimizer().compute(data, version_name, ErrorCorrectionLevel.M)
+        except DataTooLongError:
+            continue
+        symbol = rMQR(version_name, ErrorCorrectionLevel.M)
+        symbol.add_segments(segments)
+        symbol.make()
+        matrix = _bordered(symbol.to_list(with_quiet_zone=False))
+        dark_modules = sum(map(sum, matrix))
+        if best is None or dark_modules < best["dark_modules"]:
+            best = {
+                "symbology": "rmqr",
+                "version": version_name,
+                "error_correction": "M",
+                "mode": "auto",
+                "mask": None,
+                "matrix": matrix,
+                "dark_modules": dark_modules,
+                "baseline_dark_modules": dark_modules,
+                "area": area
+            }
+
+    if best is not None:
+        del best["area"]
+    return best
+
+def choose_symbol(data: str, max_objects: int = MAX_OBJECTS, minimize: str = "off", symbology: str = "qr") -> dict:
+    """
+    Like choose_qr_settings(), but across symbologies (see SYMBOLOGIES). The result adds
+    a "symbology" key; rMQR matrices are rectangular (rows != cols).
+    Raises QRCapacityError when nothing fits, or when an explicitly requested symbology
+    is unavailable (optional package missing) or cannot hold the text.
+    """
+    if symbology not in SYMBOLOGIES:
+        raise ValueError(f"Unknown symbology: {symbology}")
+
+    candidates = []
+    qr_error = None
+    if symbology in ("qr", "auto"):
+        try:
+            candidates.append(dict(choose_qr_settings(data, max_objects, minimize), symbology="qr"))
+        except QRCapacityError as e:
+            qr_error = e
+    if symbology in ("micro", "auto"):
+        if symbology == "micro" and segno is None:
+            raise QRCapacityError("Micro QR output needs the optional 'segno' package.")
+        candidates.append(_micro_candidate(data, minimize))
+    if symbology in ("rmqr", "auto"):
+        if symbology == "rmqr" and rMQR is None:
+            raise QRCapacityError("rMQR output needs the optional 'rmqrcode' package.")
+        candidates.append(_rmqr_candidate(data))
+
+    fitting = [c for c in candidates if c is not None and c["dark_modules"] <= max_objects]
+    if not fitting:
+        if qr_error is not None:
+            raise qr_error
+        if candidates == [None]:
+            # The symbol's data capacity is the limit here, not the object budget
+            raise QRCapacityError(
+                f"Text exceeds {SYMBOLOGY_LABELS[symbology]} capacity. Use the `qr` or `auto` symbology for longer text."
+            )
+        raise QRCapacityError(
+            f"Text does not fit a {SYMBOLOGY_LABELS[symbology]} code within {max_objects} objects."
+        )
+    # Fewest objects; ties keep the more widely readable symbology
+    return min(fitting, key=lambda c: (c["dark_modules"], SYMBOLOGIES.index(c["symbology"])))
+
+def symbol_label(settings: dict) -> str:
+    """
+    Short human-readable description, e.g. "QR v3-L", "Micro QR M2-L", "rMQR R13x43-M",
+    "Micro QR M1" (M1 has no error correction level).
+    """
+    symbology = settings.get("symbology", "qr")
+    version = f"v{settings['version']}" if symbology == "qr" else settings["version"]
+    label = f"{SYMBOLOGY_LABELS[symbology]} {version}"
+    error_correction = settings.get("error_correction")
+    return f"{label}-{error_correction}" if error_correction and error_correction != "-" else label
+
+def generate_qr_matrix(data: str, box_size: int = 1, max_objects: int = MAX_OBJECTS, minimize: str = "off", symbology: str = "qr") -> list:
+    """
+    Smallest code matrix (1 module border) for data that fits max_objects dark modules.
+    box_size is kept for compatibility; matrices are always one entry per module.
+    """
+    settings = choose_symbol(data, max_objects, minimize, symbology)
+    return [list(row) for row in settings["matrix"]]
+
+# ✅ Layout modes: "grid" places one object per dark module, "merged" covers k x k blocks
+# of dark modules with a single object at k x scale. The object JSON only carries a uniform
+# scale, so merging is limited to squares (a stretched 1 x k run cannot be expressed).
+LAYOUT_MODES = ("grid", "merged")
+MAX_MERGE_SIZE = 4  # largest block merged into one object
+
+# Objects with a roughly square, flat footprint that still read as one QR cell when scaled up
+MERGEABLE_OBJECTS = {
+    "SmallProtectiveCase",
+    "SmallProtectorCase",
+    "WoodenCrate",
+    "BoxWooden",
+    "StaticObj_Misc_BoxWooden",
+    "ImprovisedContainer",
+    "Land_Container_1Mo"
+}
+
+def decompose_squares(mask, max_size: int = MAX_MERGE_SIZE) -> tuple:
+    """
+    Greedy cover of the dark modules with non-overlapping squares, largest first.
+
+    Candidate k x k windows are found for the whole mask at once from a summed-area table;
+    only those candidates are visited one by one to resolve overlaps.
+    Returns (rows, cols, sizes) arrays of the top-left corner and side of every square,
+    in row-major order; unmerged modules come back as size 1.
+    """
+    free = np.array(mask, dtype=bool)
+    n_rows, n_cols = free.shape
+    rows, cols, sizes = [], [], []
+
+    for k in range(min(max_size, n_rows, n_cols), 1, -1):
+        table = np.zeros((n_rows + 1, n_cols + 1), dtype=np.int32)
+        table[1:, 1:] = free.cumsum(0).cumsum(1)
+        window = table[k:, k:] - table[:-k, k:] - table[k:, :-k] + table[:-k, :-k]
+        for r, c in zip(*np.nonzero(window == k * k)):
+            block = free[r:r + k, c:c + k]
+            if block.all():
+                block[:] = False
+                rows.append(r)
+                cols.append(c)
+                sizes.append(k)
+
+    single_rows, single_cols = np.nonzero(free)
+    rows = np.concatenate([np.array(rows, dtype=np.intp), single_rows])
+    cols = np.concatenate([np.array(cols, dtype=np.intp), single_cols])
+    sizes = np.concatenate([np.array(sizes, dtype=np.intp), np.ones(len(single_rows), dtype=np.intp)])
+
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order], sizes[order]
+
+# ✅ Structured layout record: one row per placed object, dicts are only built on serialization
+LAYOUT_DTYPE = np.dtype([
+    ("name", np.uint16),      # index into layout["names"]
+    ("pos", np.float64, 3),   # [x, z, y] as written to the object JSON
+    ("ypr", np.float64, 3),
+    ("scale", np.float64)
+])
+
+def build_layout(matrix, object_type: str, origin: dict, offset: dict, scale: float = 1.0, spacing: float = None, include_mirror_kit: bool = False, max_objects: int = MAX_OBJECTS, layout_mode: str = "grid") -> dict:
+    """
+    Vectorized layout engine. Computes every dark-module position in one pass with
+    np.nonzero + broadcasting and returns:
+    - names: object class names referenced by the "name" column
+    - objects: structured array (LAYOUT_DTYPE) of grid objects in row-major order
+    - extras: prebuilt dicts placed before the grid (mirror kit)
+    - cells: (n, 2) int array, the top-left module (row, col) each grid object covers
+    - grid: rows, cols and the world x/z of module (0, 0) plus spacing, for tiling
+
+    layout_mode="merged" covers square blocks with one scaled object (see decompose_squares());
+    it falls back to "grid" for object types not in MERGEABLE_OBJECTS.
+    Raises QRCapacityError when the grid plus extras exceed max_objects.
+    """
+    mask = np.asarray(matrix, dtype=bool)
+    rows, cols = mask.shape
     resolved_type = OBJECT_CLASS_MAP.get(object_type, object_type)
 
     spacing = spacing if spacing is not None else scale * OBJECT_SIZE_ADJUSTMENTS.get(object_type, 1.0)
@@ -56,58 +400,114 @@ def qr_to_object_list(matrix: list, object_type: str, origin: dict, offset: dict
     offset_z = round(origin["z"] - ((rows // 2) * spacing) + offset.get("z", 0), 4)
 
     top_y = origin["y"] + 0.1
-    y_step = 0.04
+    extras = _mirror_kit_objects(origin, offset, top_y) if include_mirror_kit else []
 
-    objects = []
+    if layout_mode == "merged" and object_type in MERGEABLE_OBJECTS:
+        cell_rows, cell_cols, sizes = decompose_squares(mask)
+        # A k x k block is centered on its modules and scaled to cover all of them
+        dark_rows = cell_rows + (sizes - 1) / 2
+        dark_cols = cell_cols + (sizes - 1) / 2
+        scale = scale * sizes
+    else:
+        dark_rows, dark_cols = cell_rows, cell_cols = np.nonzero(mask)
+    count = len(dark_rows)
+    if count + len(extras) > max_objects:
+        # A truncated grid is unscannable, so refuse instead of cutting the code off mid-row
+        raise QRCapacityError(
+            f"Layout needs {count + len(extras)} objects, but the object budget is {max_objects}."
+        )
 
+    objects = np.zeros(count, dtype=LAYOUT_DTYPE)
+    objects["name"] = 0
+    objects["pos"][:, 0] = offset_x + dark_cols * spacing
+    objects["pos"][:, 1] = offset_z + dark_rows * spacing  # Swaps y (height) and z
+    objects["pos"][:, 2] = round(top_y, 14)
+    objects["ypr"] = (0.0, 0.0, 90.0)  # Rotate upright along correct axis
+    objects["scale"] = scale
+
+    return {
+        "names": [resolved_type],
+        "objects": objects,
+        "extras": extras,
+        "cells": np.column_stack((cell_rows, cell_cols)),
+        "grid": {"rows": rows, "cols": cols, "x": offset_x, "z": offset_z, "spacing": spacing}
+    }
+
+def _mirror_kit_objects(origin: dict, offset: dict, top_y: float) -> list:
     # ✅ Optional test camera & mirror
-    if include_mirror_kit:
-        camera_object = {
-            "name": "DoorTestCamera",
-            "pos": [origin["x"] + offset.get("x", 0), top_y, origin["z"] + offset.get("z", 0)],
-            "ypr": [0.0, 90.0, 0.0],
-            "scale": 1.0,
-            "enableCEPersistency": 0,
-            "customString": json.dumps({"mirror_enabled": True})
-        }
-        mirror_object = {
-            "name": "Land_Mirror_Test_Kit",
-            "pos": [origin["x"], top_y - 0.1, origin["z"]],
-            "ypr": [0.0, 90.0, 0.0],
-            "scale": 1.5,
+    camera_object = {
+        "name": "DoorTestCamera",
+        "pos": [origin["x"] + offset.get("x", 0), top_y, origin["z"] + offset.get("z", 0)],
+        "ypr": [0.0, 90.0, 0.0],
+        "scale": 1.0,
+        "enableCEPersistency": 0,
+        "customString": json.dumps({"mirror_enabled": True})
+    }
+    mirror_object = {
+        "name": "Land_Mirror_Test_Kit",
+        "pos": [origin["x"], top_y - 0.1, origin["z"]],
+        "ypr": [0.0, 90.0, 0.0],
+        "scale": 1.5,
+        "enableCEPersistency": 0,
+        "customString": ""
+    }
+    return [camera_object, mirror_object]
+
+def layout_to_objects(layout: dict) -> list:
+    """
+    Materializes a layout from build_layout() into the list-of-dicts object format.
+    """
+    names = layout["names"]
+    objects = layout["objects"]
+    return list(layout["extras"]) + [
+        {
+            "name": names[name],
+            "pos": pos,
+            "ypr": ypr,
+            "scale": scale,
             "enableCEPersistency": 0,
             "customString": ""
         }
-        objects.append(camera_object)
-        objects.append(mirror_object)
-
-    # ✅ Single layer only (not stacked)
-    for row in range(rows):
-        for col in range(cols):
-            if matrix[row][col]:
-                base_x = offset_x + (col * spacing)
-                base_z = offset_z + (row * spacing)
-
-                if len(objects) >= MAX_OBJECTS:
-                    return objects
-
-                y = round(top_y, 14)
-                obj = {
-                    "name": resolved_type,
-                    "pos": [base_x, base_z, y],  # Swaps y (height) and z
-                    "ypr": [0.0, 0.0, 90.0],  # Rotate upright along correct axis
-                    "scale": scale,
-                    "enableCEPersistency": 0,
-                    "customString": ""
-                }
-                objects.append(obj)
-
-    return objects
-
-def save_object_json(object_list: list, output_path: str):
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w") as f:
-        json.dump({"Objects": object_list}, f, indent=2)
+        for name, pos, ypr, scale in zip(
+            objects["name"].tolist(),
+            objects["pos"].tolist(),
+            objects["ypr"].tolist(),
+            objects["scale"].tolist()
+        )
+    ]
+
+def object_budget(include_mirror_kit: bool = False, max_objects: int = MAX_OBJECTS) -> int:
+    """
+    Objects left for the QR grid once the optional mirror kit is placed.
+    """
+    return max_objects - (2 if include_mirror_kit else 0)
+
+def qr_to_object_list(matrix: list, object_type: str, origin: dict, offset: dict, scale: float = 1.0, spacing: float = None, include_mirror_kit: bool = False) -> list:
+    """
+    Compatibility wrapper around build_layout() + layout_to_objects().
+    """
+    layout = build_layout(matrix, object_type, origin, offset, scale, spacing, include_mirror_kit)
+    return layout_to_objects(layout)
+
+def mirror_backdrop_object(origin: dict, scale: float) -> dict:
+    """
+    Large MirrorTestKit placed just behind the QR layout (used by rebuilds).
+    """
+    return {
+        "name": "MirrorTestKit",
+        "pos": [origin["x"], origin["y"] - 0.01, origin["z"]],
+        "ypr": [0.0, 90.0, 0.0],
+        "scale": max(scale * 12, 10.0),
+        "enableCEPersistency": 0,
+        "customString": ""
+    }
+
+def save_object_json(object_list: list, output_path: str, pretty: bool = False, compress: bool = False):
+    """
+    Writes the object layout file. Compact (rounded, single-line) by default;
+    pretty=True keeps the original indented format.
+    """
+    write_object_json(object_list, output_path, pretty=pretty, compress=compress)
 
 # ✅ Manual test
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+import io
+import json
+import zipfile
+import numpy as np
+
+from object_serializer import iter_layout_json
+from qr_generator import QRCapacityError
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def plan_tile_size(cells: np.ndarray, rows: int, cols: int, max_objects: int, reserved: int = 0) -> int:
+    """
+    Largest square tile side (in modules) whose busiest tile holds at most max_objects.
+    reserved objects (mirror kit / backdrop) travel with the first non-empty tile.
+    Raises QRCapacityError (shown to the user by the build commands) when max_objects
+    leaves no room next to the reserved objects.
+    """
+    if max_objects - reserved < 1:
+        raise QRCapacityError(
+            f"Tile size of {max_objects} objects leaves no room next to {reserved} extra objects; raise tile_max_objects."
+        )
+
+    for size in range(max(rows, cols), 0, -1):
+        tiles_per_row = -(-cols // size)
+        counts = np.bincount((cells[:, 0] // size) * tiles_per_row + cells[:, 1] // size)
+        nonempty = np.flatnonzero(counts)
+        first = counts[nonempty[0]] if len(nonempty) else 0
+        if counts.max(initial=0) <= max_objects and first + reserved <= max_objects:
+            return size
+    return 1
+
+
+def iter_tiles(layout: dict, size: int):
+    """
+    Yields (tile_row, tile_col, sub_layout) for every non-empty size x size tile in
+    row-major tile order. Sub-layouts are built one at a time, so only a single tile's
+    objects are ever copied out of the full layout.
+    """
+    grid = layout["grid"]
+    cells = layout["cells"]
+    tiles_per_row = -(-grid["cols"] // size)
+    tile_ids = (cells[:, 0] // size) * tiles_per_row + cells[:, 1] // size
+
+    order = np.argsort(tile_ids, kind="stable")
+    sorted_ids = tile_ids[order]
+    bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+    extras = layout["extras"]
+
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+        if start == end:
+            continue
+        tile_id = int(sorted_ids[start])
+        yield tile_id // tiles_per_row, tile_id % tiles_per_row, {
+            "names": layout["names"],
+            "objects": layout["objects"][order[start:end]],
+            "extras": extras
+        }
+        extras = []
+
+
+def export_tiles(layout: dict, zip_path: str, max_objects: int, pretty: bool = False, metadata: dict = None) -> dict:
+    """
+    Splits a build_layout() result into square tiles of at most max_objects objects and
+    streams each tile straight into one zip (tiles/tile_rXX_cYY.json) next to a manifest.json
+    describing module and world offsets, so large builds can be imported tile by tile.
+
+    Returns the manifest.
+    """
+    grid = layout["grid"]
+    size = plan_tile_size(layout["cells"], grid["rows"], grid["cols"], max_objects, len(layout["extras"]))
+    tiles = []
+
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for tile_row, tile_col, tile in iter_tiles(layout, size):
+            name = f"tiles/tile_r{tile_row:02d}_c{tile_col:02d}.json"
+            with zf.open(name, "w") as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+                f.writelines(iter_layout_json(tile, pretty=pretty))
+            tiles.append({
+                "file": name,
+                "tile_row": tile_row,
+                "tile_col": tile_col,
+                "module_offset": {"row": tile_row * size, "col": tile_col * size},
+                "world_offset": {
+                    "x": round(grid["x"] + tile_col * size * grid["spacing"], 4),
+                    "z": round(grid["z"] + tile_row * size * grid["spacing"], 4)
+                },
+                "objects": len(tile["extras"]) + len(tile["objects"])
+            })
+
+        manifest = {
+            "format": MANIFEST_VERSION,
+            **(metadata or {}),
+            "rows": grid["rows"],
+            "cols": grid["cols"],
+            "tile_modules": size,
+            "tile_max_objects": max_objects,
+            "total_objects": sum(tile["objects"] for tile in tiles),
+            "tiles": tiles
+        }
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+    print(f"[tile_exporter] ✅ Exported {len(tiles)} tiles ({size}x{size} modules) to {zip_path}")
+    return manifest
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from config import CONFIG
+from qr_generator import choose_symbol, MAX_OBJECTS
+from preview_renderer import RENDERER_VERSION
+
+# Bump when the cached artifact layout or object JSON format changes
+CACHE_SCHEMA_VERSION = 3
+
+CACHE_DIR = CONFIG["build_cache_dir"]
+MAX_CACHE_BYTES = int(CONFIG["build_cache_max_mb"] * 1024 * 1024)
+MATRIX_CACHE_SIZE = CONFIG["matrix_cache_size"]
+
+CACHE_STATS = {
+    "matrix_hits": 0,
+    "matrix_misses": 0,
+    "artifact_hits": 0,
+    "artifact_misses": 0,
+    "evictions": 0
+}
+
+_matrix_cache = OrderedDict()
+_disk_index = None  # key -> size in bytes, oldest first
+# Builds run on worker threads: guards _matrix_cache, _disk_index, CACHE_STATS and evict -> rmtree
+_lock = threading.RLock()
+
+
+def _count(name: str, stats: dict = None):
+    # Caller holds _lock. stats, when given, collects the same counts for one build only.
+    CACHE_STATS[name] += 1
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + 1
+
+
+def build_key(text: str, object_type: str, scale: float, spacing: float, origin: dict, offset: dict,
+              include_mirror_kit: bool = False, mirror_backdrop: bool = False,
+              preview_format: str = None, preview_max_bytes: int = None, minimize: str = "off",
+              layout_mode: str = "grid", symbology: str = "qr", tile_objects: int = None,
+              preview_pyramid: bool = False) -> str:
+    """
+    Content address for a build: every input that changes the object JSON or preview.
+    """
+    params = {
+        "schema": CACHE_SCHEMA_VERSION,
+        "renderer": RENDERER_VERSION,
+        "text": text,
+        "object_type": object_type,
+        "scale": scale,
+        "spacing": spacing,
+        "origin": origin,
+        "offset": offset,
+        "include_mirror_kit": bool(include_mirror_kit),
+        "mirror_backdrop": bool(mirror_backdrop),
+        "pretty_json": CONFIG["pretty_object_json"],
+        "preview_format": preview_format,
+        "preview_max_bytes": preview_max_bytes,
+        "minimize": minimize,
+        "layout_mode": layout_mode,
+        "symbology": symbology,
+        "tile_objects": tile_objects,
+        "preview_pyramid": bool(preview_pyramid),
+        "preview_memory_limit_mb": CONFIG["preview_memory_limit_mb"],
+        "preview_max_side": CONFIG["preview_max_side"]
+    }
+    encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def get_qr_code(text: str, max_objects: int = MAX_OBJECTS, minimize: str = "off", symbology: str = "qr", stats: dict = None) -> dict:
+    """
+    Memoized choose_symbol() backed by a bounded in-process LRU.
+    The matrix is returned as a list of lists; the hit or miss is also counted into stats, if given.
+    Raises QRCapacityError (not cached) when the text does not fit max_objects.
+    """
+    cache_key = (text, max_objects, minimize, symbology)
+    with _lock:
+        qr_code = _matrix_cache.get(cache_key)
+        if qr_code is not None:
+            _matrix_cache.move_to_end(cache_key)
+            _count("matrix_hits", stats)
+            return qr_code
+        _count("matrix_misses", stats)
+
+    # Encoding runs unlocked; two threads missing on the same text both encode, one result is kept
+    settings = choose_symbol(text, max_objects, minimize, symbology)
+    qr_code = dict(settings, matrix=[list(row) for row in settings["matrix"]])
+    with _lock:
+        _matrix_cache[cache_key] = qr_code
+        while len(_matrix_cache) > MATRIX_CACHE_SIZE:
+            _matrix_cache.popitem(last=False)
+    return qr_code
+
+
+def get_matrix(text: str, max_objects: int = MAX_OBJECTS, minimize: str = "off", symbology: str = "qr") -> list:
+    """
+    Matrix only, see get_qr_code().
+    """
+    return get_qr_code(text, max_objects, minimize, symbology)["matrix"]
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], key)
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0  # removed while we were walking (evicted, or a temp file)
+
+
+def _entry_size(path: str) -> int:
+    return sum(
+        _file_size(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def copy_artifact(src: str, dst: str):
+    """
+    Copy a cached artifact, which may be a directory (e.g. a preview tile pyramid).
+    """
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+    else:
+        shutil.copyfile(src, dst)
+
+
+def _load_index() -> OrderedDict:
+    """
+    Scan the cache directory once and order entries by last use (mtime of meta.json).
+    """
+    global _disk_index
+    with _lock:
+        if _disk_index is not None:
+            return _disk_index
+
+        entries = []
+        if os.path.isdir(CACHE_DIR):
+            for shard in os.listdir(CACHE_DIR):
+                shard_dir = os.path.join(CACHE_DIR, shard)
+                if not os.path.isdir(shard_dir):
+                    continue
+                for key in os.listdir(shard_dir):
+                    if key.startswith("."):
+                        continue  # an entry still being written (see store_artifacts)
+                    meta_path = os.path.join(shard_dir, key, "meta.json")
+                    try:
+                        entries.append((os.path.getmtime(meta_path), key, _entry_size(os.path.join(shard_dir, key))))
+                    except OSError:
+                        shutil.rmtree(os.path.join(shard_dir, key), ignore_errors=True)
+
+        _disk_index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        return _disk_index
+
+
+def _evict(index: OrderedDict, stats: dict = None):
+    # Caller holds _lock, so no lookup can return an entry that is about to be removed
+    total = sum(index.values())
+    while index and total > MAX_CACHE_BYTES:
+        key, size = index.popitem(last=False)
+        shutil.rmtree(_entry_dir(key), ignore_errors=True)
+        total -= size
+        _count("evictions", stats)
+
+
+def lookup_artifacts(key: str, stats: dict = None) -> dict | None:
+    """
+    Return the cached artifact set for a key, or None on a miss (counted into stats, if given).
+    The entry is marked as most recently used.
+    """
+    entry_dir = _entry_dir(key)
+    meta_path = os.path.join(entry_dir, "meta.json")
+
+    with _lock:
+        index = _load_index()
+        # Entries may have been written by another worker process, so the disk is authoritative
+        if not os.path.exists(meta_path):
+            index.pop(key, None)
+            _count("artifact_misses", stats)
+            return None
+
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            with open(os.path.join(entry_dir, "matrix.json"), "r") as f:
+                matrix = json.load(f)
+            os.utime(meta_path)
+        except (OSError, ValueError) as e:
+            print(f"[build_cache] ⚠️ Dropping unreadable cache entry {key[:12]}: {e}")
+            index.pop(key, None)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            _count("artifact_misses", stats)
+            return None
+
+        index[key] = index.get(key) or _entry_size(entry_dir)
+        index.move_to_end(key)
+        _count("artifact_hits", stats)
+    return {
+        "matrix": matrix,
+        "object_count": meta["object_count"],
+        "qr_info": meta.get("qr_info", {}),
+        "object_json_path": os.path.join(entry_dir, "objects.json"),
+        "preview_path": os.path.join(entry_dir, meta["preview_name"]),
+        "extra_paths": {name: os.path.join(entry_dir, name) for name in meta.get("extra_names", [])}
+    }
+
+
+def store_artifacts(key: str, matrix: list, object_count: int, object_json_path: str, preview_path: str, qr_info: dict = None, extra_paths: dict = None, stats: dict = None):
+    """
+    Copy freshly built artifacts into the cache, then evict least recently used entries over budget.
+    qr_info (symbol, version, error correction, mask, ...) is kept in meta.json for the build summary.
+    extra_paths maps cache file names to additional artifacts (e.g. the tile archive or pyramid directory).
+    Evictions are counted into stats, if given.
+    """
+    entry_dir = _entry_dir(key)
+    preview_name = "preview" + os.path.splitext(preview_path)[1]
+
+    # Written unlocked into a hidden sibling directory, then renamed into place under the lock,
+    # so index scans and lookups never see a partial entry
+    tmp_dir = None
+    try:
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=os.path.dirname(entry_dir))
+        with open(os.path.join(tmp_dir, "matrix.json"), "w") as f:
+            json.dump(matrix, f, separators=(",", ":"))
+        shutil.copyfile(object_json_path, os.path.join(tmp_dir, "objects.json"))
+        shutil.copyfile(preview_path, os.path.join(tmp_dir, preview_name))
+        for name, path in (extra_paths or {}).items():
+            copy_artifact(path, os.path.join(tmp_dir, name))
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({
+                "object_count": object_count,
+                "preview_name": preview_name,
+                "qr_info": qr_info or {},
+                "extra_names": sorted(extra_paths or {})
+            }, f)
+        size = _entry_size(tmp_dir)
+    except OSError as e:
+        print(f"[build_cache] ⚠️ Failed to store cache entry {key[:12]}: {e}")
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    with _lock:
+        index = _load_index()
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another thread or process stored the same key first; keep that entry
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                return
+            size = index.get(key) or _entry_size(entry_dir)
+        index[key] = size
+        index.move_to_end(key)
+        _evict(index, stats)
+
+
+def merge_cache_stats(delta: dict):
+    """
+    Add counters reported by a build that ran in a worker process (build_executor_mode "process"),
+    whose CACHE_STATS are not this process's.
+    """
+    with _lock:
+        for name, value in delta.items():
+            CACHE_STATS[name] += value
+
+
+def warm_cache_index():
+    """
+    Index the artifact cache at startup (one walk of CACHE_DIR), before the event loop runs.
+    """
+    index = _load_index()
+    print(f"[build_cache] ✅ Indexed {len(index)} cached builds")
+
+
+def get_cache_stats(scan: bool = True) -> dict:
+    """
+    Snapshot of hit/miss counters plus current cache occupancy.
+    In "process" executor mode the counters are merged back from each build result, but
+    matrix_entries and the artifact index only reflect this process (workers keep their own).
+    scan=False never touches the disk: artifact_entries / artifact_bytes are None until the
+    index has been loaded (see warm_cache_index), so it is safe to call on the event loop.
+    """
+    with _lock:
+        index = _load_index() if scan or _disk_index is not None else None
+        stats = dict(CACHE_STATS)
+        stats["matrix_entries"] = len(_matrix_cache)
+        stats["artifact_entries"] = len(index) if index is not None else None
+        stats["artifact_bytes"] = sum(index.values()) if index is not None else None
+    return stats
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from config import CONFIG
+
+MAX_CONCURRENT_BUILDS = CONFIG["build_queue_concurrency"]
+MAX_PENDING_BUILDS = CONFIG["build_queue_max_pending"]
+
+
+class BuildQueueFull(Exception):
+    """Raised when a build is submitted while the queue is already at MAX_PENDING_BUILDS."""
+
+
+_semaphore = None
+_pending = 0
+_running = 0
+_wait_times = deque(maxlen=500)  # seconds spent waiting for a slot, most recent builds
+
+QUEUE_STATS = {
+    "admitted": 0,
+    "completed": 0,
+    "rejected": 0
+}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_BUILDS)
+    return _semaphore
+
+
+@asynccontextmanager
+async def build_slot():
+    """
+    Global admission control for builds: at most MAX_CONCURRENT_BUILDS run at once and
+    at most MAX_PENDING_BUILDS wait behind them. Further builds raise BuildQueueFull
+    immediately instead of piling up.
+    """
+    global _pending, _running
+    if _pending >= MAX_PENDING_BUILDS:
+        QUEUE_STATS["rejected"] += 1
+        raise BuildQueueFull()
+
+    _pending += 1
+    queued_at = time.monotonic()
+    try:
+        await _get_semaphore().acquire()
+    finally:
+        _pending -= 1
+
+    _wait_times.append(time.monotonic() - queued_at)
+    QUEUE_STATS["admitted"] += 1
+    _running += 1
+    try:
+        yield
+    finally:
+        _running -= 1
+        QUEUE_STATS["completed"] += 1
+        _get_semaphore().release()
+
+
+def get_queue_stats() -> dict:
+    waits = sorted(_wait_times)
+    return {
+        **QUEUE_STATS,
+        "depth": _pending,
+        "running": _running,
+        "concurrency": MAX_CONCURRENT_BUILDS,
+        "max_pending": MAX_PENDING_BUILDS,
+        "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+        "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0
+    }
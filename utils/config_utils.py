@@ -1,5 +1,7 @@
-import json
-import os
+import asyncio
+import copy
+
+from utils.json_store import JsonStore
 
 CONFIGS_FILE = "data/guild_configs.json"
 
@@ -15,53 +17,64 @@ DEFAULTS = {
     "map_coordinates": {"x": 5000.0, "y": 0.0, "z": 5000.0},
     "custom_spacing": {},
     "custom_scale": {},
-    "include_mirror_kit": False  # ✅ Toggle for mirror overlay backdrop
+    "include_mirror_kit": False,  # ✅ Toggle for mirror overlay backdrop
+    "preview_format": "png",  # png | webp | jpeg
+    "preview_max_bytes": 8_000_000,  # ✅ Keep uploads under Discord's attachment limit
+    "minimize_objects": "off",  # off | mask | mask_ecc (fewest dark modules -> fewest objects)
+    "layout_mode": "grid",  # grid | merged (square blocks of crate-like objects become one scaled object)
+    "symbology": "qr",  # qr | micro | rmqr | auto (Micro QR / rMQR need segno / rmqrcode and a capable scanner)
+    "tile_max_objects": None,  # ✅ Set (e.g. 950) to allow codes up to 177x177, exported as tiles of this many objects
+    "preview_pyramid": False  # ✅ Also build a zoomable tile pyramid for the web gallery (/pushgallery)
 }
 
-def get_guild_config(guild_id: int) -> dict:
+_store = JsonStore(CONFIGS_FILE)
+_guild_locks = {}
+
+def guild_lock(guild_id) -> asyncio.Lock:
     """
-    Load per-guild configuration. Fills in any missing keys with defaults.
+    Per-guild lock: hold it across get_guild_config() -> modify -> save_guild_config()
+    so concurrent commands in the same guild cannot overwrite each other's changes.
     """
-    os.makedirs("data", exist_ok=True)
-    guild_id_str = str(guild_id)
-
-    try:
-        with open(CONFIGS_FILE, "r") as f:
-            all_configs = json.load(f)
-    except FileNotFoundError:
-        all_configs = {}
-
-    config = all_configs.get(guild_id_str, {})
+    key = str(guild_id)
+    lock = _guild_locks.get(key)
+    if lock is None:
+        lock = _guild_locks[key] = asyncio.Lock()
+    return lock
 
+def _apply_defaults(config: dict, guild_id_str: str) -> bool:
     updated = False
     for key, value in DEFAULTS.items():
         if key not in config:
-            config[key] = value if not isinstance(value, str) else value.format(guild_id=guild_id_str)
+            config[key] = value.format(guild_id=guild_id_str) if isinstance(value, str) else copy.deepcopy(value)
             updated = True
+    return updated
 
+def migrate_guild_configs() -> None:
+    """
+    Fill missing default keys for every stored guild once at startup.
+    """
+    all_configs = _store.data()
+    updated = False
+    for guild_id_str, config in all_configs.items():
+        updated = _apply_defaults(config, guild_id_str) or updated
     if updated:
-        all_configs[guild_id_str] = config
-        with open(CONFIGS_FILE, "w") as f:
-            json.dump(all_configs, f, indent=2)
+        _store.mark_dirty()
 
+def get_guild_config(guild_id: int) -> dict:
+    """
+    Load per-guild configuration from memory. Missing keys are filled with defaults.
+    Returns a copy; call save_guild_config() to persist changes.
+    """
+    guild_id_str = str(guild_id)
+    config = copy.deepcopy(_store.data().get(guild_id_str, {}))
+    _apply_defaults(config, guild_id_str)
     return config
 
 def save_guild_config(guild_id: int, updated_config: dict) -> None:
     """
-    Save the updated config dictionary for a guild back to the config file.
+    Save the updated config dictionary for a guild (flushed to disk write-behind).
     """
-    os.makedirs("data", exist_ok=True)
-    guild_id_str = str(guild_id)
-
-    try:
-        with open(CONFIGS_FILE, "r") as f:
-            all_configs = json.load(f)
-    except FileNotFoundError:
-        all_configs = {}
-
-    all_configs[guild_id_str] = updated_config
-    with open(CONFIGS_FILE, "w") as f:
-        json.dump(all_configs, f, indent=2)
+    _store.set(str(guild_id), copy.deepcopy(updated_config))
 
 # Alias to match expected import
 update_guild_config = save_guild_config
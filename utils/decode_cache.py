@@ -0,0 +1,98 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from config import CONFIG
+
+DECODE_CACHE_SIZE = CONFIG["decode_cache_size"]
+DECODE_CACHE_TTL = CONFIG["decode_cache_ttl"]
+
+DECODE_CACHE_STATS = {
+    "attachment_hits": 0,  # answered from the attachment ID, no download
+    "content_hits": 0,  # downloaded, but hashing found an earlier decode
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0
+}
+
+_payloads = OrderedDict()  # content hash -> (decoded payloads, stored at), oldest first
+_attachments = OrderedDict()  # Discord attachment ID -> content hash
+
+
+def content_hash(img_bytes: bytes) -> str:
+    """
+    Cache key for an uploaded image (sha256 of the raw bytes; ~20ms for a 20 MB upload).
+    """
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+def _get(digest: str) -> list | None:
+    entry = _payloads.get(digest)
+    if entry is None:
+        return None
+    texts, stored_at = entry
+    if time.monotonic() - stored_at > DECODE_CACHE_TTL:
+        del _payloads[digest]
+        DECODE_CACHE_STATS["expired"] += 1
+        return None
+    _payloads.move_to_end(digest)
+    return list(texts)
+
+
+def lookup_attachment(attachment_id) -> list | None:
+    """
+    Decoded payloads for an attachment already seen, checked before downloading it.
+    Does not count a miss: the content lookup that follows does.
+    """
+    digest = _attachments.get(str(attachment_id))
+    texts = _get(digest) if digest else None
+    if texts is not None:
+        DECODE_CACHE_STATS["attachment_hits"] += 1
+    return texts
+
+
+def lookup_content(digest: str, attachment_id=None) -> list | None:
+    """
+    Decoded payloads for image bytes with this content_hash(), or None on a miss.
+    A hit also remembers the attachment ID for the next lookup_attachment().
+    """
+    texts = _get(digest)
+    if texts is None:
+        DECODE_CACHE_STATS["misses"] += 1
+        return None
+    DECODE_CACHE_STATS["content_hits"] += 1
+    if attachment_id is not None:
+        _remember_attachment(attachment_id, digest)
+    return texts
+
+
+def _remember_attachment(attachment_id, digest: str):
+    _attachments[str(attachment_id)] = digest
+    _attachments.move_to_end(str(attachment_id))
+    while len(_attachments) > DECODE_CACHE_SIZE * 2:
+        _attachments.popitem(last=False)
+
+
+def store_decoded(digest: str, texts: list, attachment_id=None):
+    """
+    Cache a successful decode (every payload found in the image). Failed decodes are not
+    cached, so a later decoder improvement (or a retry after a timeout) gets another chance.
+    """
+    _payloads[digest] = (list(texts), time.monotonic())
+    _payloads.move_to_end(digest)
+    while len(_payloads) > DECODE_CACHE_SIZE:
+        _payloads.popitem(last=False)
+        DECODE_CACHE_STATS["evictions"] += 1
+    if attachment_id is not None:
+        _remember_attachment(attachment_id, digest)
+
+
+def get_decode_cache_stats() -> dict:
+    hits = DECODE_CACHE_STATS["attachment_hits"] + DECODE_CACHE_STATS["content_hits"]
+    lookups = hits + DECODE_CACHE_STATS["misses"]
+    return {
+        **DECODE_CACHE_STATS,
+        "entries": len(_payloads),
+        "max_entries": DECODE_CACHE_SIZE,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+    }
@@ -0,0 +1,81 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from config import CONFIG
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+_mode = CONFIG["build_executor_mode"]
+_max_workers = CONFIG["build_max_workers"]
+_job_timeout = CONFIG["build_job_timeout"]
+
+_pool = None
+_semaphore = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        if _mode == "process":
+            _pool = ProcessPoolExecutor(max_workers=_max_workers)
+        else:
+            _pool = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="qr-build")
+    return _pool
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_max_workers)
+    return _semaphore
+
+
+def configure_executor(mode: str = None, max_workers: int = None, job_timeout: float = None):
+    """
+    Switch execution mode at runtime (used for benchmarking).
+    The existing pool is shut down and recreated lazily on the next job.
+
+    Modes:
+    - inline: run on the event loop (old behaviour, blocks the gateway)
+    - thread: shared ThreadPoolExecutor (Pillow/OpenCV/zbar release the GIL for most work)
+    - process: ProcessPoolExecutor, full isolation; job functions and args must be picklable
+    """
+    global _mode, _max_workers, _job_timeout, _semaphore
+    if mode is not None and mode not in EXECUTOR_MODES:
+        raise ValueError(f"Unknown executor mode '{mode}', expected one of {EXECUTOR_MODES}")
+
+    shutdown_executor()
+    _mode = mode or _mode
+    _max_workers = max_workers or _max_workers
+    _job_timeout = job_timeout if job_timeout is not None else _job_timeout
+    _semaphore = None
+
+
+def shutdown_executor():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def get_executor_info() -> dict:
+    return {"mode": _mode, "max_workers": _max_workers, "job_timeout": _job_timeout}
+
+
+async def run_job(func, *args, timeout: float = None, **kwargs):
+    """
+    Run a CPU-bound build stage off the event loop with bounded concurrency.
+
+    Raises asyncio.TimeoutError when the job exceeds its timeout. A timed out thread or
+    process job cannot be interrupted; it finishes in the background but its result is dropped.
+    """
+    timeout = timeout if timeout is not None else _job_timeout
+
+    async with _get_semaphore():
+        if _mode == "inline":
+            return func(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_get_pool(), functools.partial(func, *args, **kwargs))
+        return await asyncio.wait_for(future, timeout)
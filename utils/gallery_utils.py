@@ -8,7 +8,11 @@ GALLERY_DATA_ROOT = "data/galleries"
 LATEST_PREVIEW_JSON = "data/previews.json"
 LATEST_OUTPUT_JSON = "data/output_build.json"
 
-def save_to_gallery(preview_path, zip_path, metadata: dict, server_id: str = "unknown"):
+def save_to_gallery(preview_path, zip_path, metadata: dict, server_id: str = "unknown", pyramid_path: str = None):
+    """
+    Copy a build's preview and zip into the public gallery and record the entry.
+    pyramid_path (a .dzi next to its _files directory) adds a zoomable view of the preview.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     base_name = f"{metadata['object_type']}_{timestamp}"
 
@@ -17,13 +21,25 @@ def save_to_gallery(preview_path, zip_path, metadata: dict, server_id: str = "un
     os.makedirs(gallery_dir, exist_ok=True)
 
     # Target output paths
-    preview_target = os.path.join(gallery_dir, f"{base_name}.png")
+    preview_ext = os.path.splitext(preview_path)[1] or ".png"
+    preview_target = os.path.join(gallery_dir, f"{base_name}{preview_ext}")
     zip_target = os.path.join(gallery_dir, f"{base_name}.zip")
 
     # Copy preview and zip into server folder
     shutil.copy(preview_path, preview_target)
     shutil.copy(zip_path, zip_target)
 
+    # Deep Zoom pyramid: descriptor + tile directory, renamed to match the entry
+    dzi_name = None
+    if pyramid_path and os.path.exists(pyramid_path):
+        dzi_name = f"{base_name}.dzi"
+        shutil.copy(pyramid_path, os.path.join(gallery_dir, dzi_name))
+        shutil.copytree(
+            os.path.splitext(pyramid_path)[0] + "_files",
+            os.path.join(gallery_dir, f"{base_name}_files"),
+            dirs_exist_ok=True
+        )
+
     # Load or initialize server-specific gallery JSON
     server_gallery_json = os.path.join(GALLERY_DATA_ROOT, f"gallery_{server_id}.json")
     os.makedirs(os.path.dirname(server_gallery_json), exist_ok=True)
@@ -36,13 +52,15 @@ def save_to_gallery(preview_path, zip_path, metadata: dict, server_id: str = "un
 
     # Build gallery entry
     entry = {
-        "image": f"gallery/{server_id}/{base_name}.png",
+        "image": f"gallery/{server_id}/{base_name}{preview_ext}",
         "zip": f"gallery/{server_id}/{base_name}.zip",
         "object_type": metadata["object_type"],
         "qr_size": metadata["qr_size"],
         "total_objects": metadata["total_objects"],
         "created": timestamp
     }
+    if dzi_name:
+        entry["dzi"] = f"gallery/{server_id}/{dzi_name}"
     gallery.append(entry)
 
     # Save updated gallery file
@@ -0,0 +1,98 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+
+from config import CONFIG
+
+FLUSH_DELAY = CONFIG["store_flush_delay"]
+
+_stores = []
+
+
+class JsonStore:
+    """
+    Process-wide in-memory view of a JSON file.
+
+    The file is read once on first access; reads are served from memory and writes
+    mark the store dirty and schedule a debounced write-behind flush. Flushes write a
+    temp file in the same directory and os.replace() it over the target, so readers
+    never see a half-written file. Pending writes are flushed at interpreter exit.
+    """
+
+    def __init__(self, path: str, flush_delay: float = FLUSH_DELAY):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._data = None
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # serializes file writes; never held with _lock by readers
+        _stores.append(self)
+
+    def data(self) -> dict:
+        with self._lock:
+            if self._data is None:
+                try:
+                    with open(self.path, "r") as f:
+                        self._data = json.load(f)
+                except FileNotFoundError:
+                    self._data = {}
+            return self._data
+
+    def set(self, key: str, value):
+        """
+        Replace a top-level entry and schedule a flush.
+        """
+        with self._lock:
+            self.data()[key] = value
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        """
+        Schedule a flush; repeated writes inside the delay window coalesce into one.
+        """
+        with self._lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        # Snapshot under the data lock, write without it: readers on the event loop never
+        # wait for disk I/O. The write lock keeps snapshots landing on disk in order.
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty or self._data is None:
+                    return
+                payload = json.dumps(self._data, indent=2)
+                self._dirty = False
+
+            directory = os.path.dirname(self.path) or "."
+            tmp_path = None
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+                with os.fdopen(fd, "w") as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[json_store] ❌ Failed to write {self.path}: {e}")
+                with self._lock:
+                    self._dirty = True
+                if tmp_path:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+
+def flush_all_stores():
+    for store in _stores:
+        store.flush()
+
+
+atexit.register(flush_all_stores)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from config import CONFIG
+
+METRICS_WINDOW = CONFIG["metrics_window"]
+METRICS_LOG_PATH = CONFIG["metrics_log_path"]
+
+# Stage names in the order a build runs them (others are listed after these in /botstats)
+BUILD_STAGES = ["queue_wait", "encode", "layout", "write_json", "tiles", "preview", "pyramid", "cache_store", "cache_restore", "package", "upload", "total"]
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Build stages that are mostly disk reads / writes, summed into file_io_seconds
+FILE_IO_STAGES = ("write_json", "tiles", "cache_store", "cache_restore", "package")
+
+_samples = defaultdict(lambda: deque(maxlen=METRICS_WINDOW))  # metric -> recent values
+_counters = defaultdict(int)
+_totals = defaultdict(float)  # (name, labels) -> monotonic total since startup
+_histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+_lock = threading.Lock()
+_log = None
+_loop_lag_task = None
+_started = time.time()
+
+
+class StageTimer:
+    """
+    Wall-clock durations of the named stages of one build, in milliseconds.
+    Plain data only, so it can be filled in a worker process and returned with the build.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0.0) + (time.perf_counter() - start) * 1000, 2)
+
+    def finish(self) -> dict:
+        self.timings["total"] = round((time.perf_counter() - self._start) * 1000, 2)
+        return self.timings
+
+
+def _metrics_log() -> logging.Logger:
+    """
+    JSON-lines logger writing one record per build, rotated by size.
+    """
+    global _log
+    if _log is None:
+        os.makedirs(os.path.dirname(METRICS_LOG_PATH) or ".", exist_ok=True)
+        handler = RotatingFileHandler(
+            METRICS_LOG_PATH,
+            maxBytes=int(CONFIG["metrics_log_max_mb"] * 1024 * 1024),
+            backupCount=CONFIG["metrics_log_backups"]
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _log = logging.getLogger("qr4me.metrics")
+        _log.setLevel(logging.INFO)
+        _log.propagate = False
+        _log.addHandler(handler)
+    return _log
+
+
+def record(metric: str, value: float):
+    with _lock:
+        _samples[metric].append(value)
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Add to a labelled counter (exported as <name>_total on /metrics).
+    """
+    with _lock:
+        _totals[(name, _labels(labels))] += value
+
+
+def observe(name: str, seconds: float, **labels):
+    """
+    Add one observation to a labelled latency histogram (LATENCY_BUCKETS, cumulative since startup).
+    """
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def get_prometheus_series() -> dict:
+    """
+    Snapshot of the labelled series: {"counters": {(name, labels): total}, "histograms": {(name, labels): [...]}}.
+    """
+    with _lock:
+        return {
+            "counters": dict(_totals),
+            "histograms": {key: list(values) for key, values in _histograms.items()}
+        }
+
+
+def percentiles(values, points=(50, 95, 99)) -> dict:
+    """
+    Nearest-rank percentiles of values: {"p50": ..., "p95": ..., "p99": ...}.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{point}": 0.0 for point in points}
+    return {f"p{point}": ordered[min(len(ordered) - 1, max(0, round(point / 100 * len(ordered)) - 1))] for point in points}
+
+
+def record_build(command: str, build: dict, upload_seconds: float = None):
+    """
+    Aggregate one finished build (a run_build_async() result) and append it to the metrics log.
+
+    Stage durations come from build["timings"] (milliseconds, measured in whichever worker
+    ran the build), plus the Discord upload measured by the command.
+    """
+    timings = dict(build.get("timings", {}))
+    if upload_seconds is not None:
+        timings["upload"] = round(upload_seconds * 1000, 2)
+    # Cache hits carry the original build's preview stats; only fresh renders measured memory
+    preview = {} if build.get("cached") else build.get("qr_info", {}).get("preview", {})
+
+    with _lock:
+        for stage, ms in timings.items():
+            _samples[f"stage.{stage}"].append(ms)
+        _samples["objects"].append(build.get("object_count", 0))
+        _samples["output_bytes"].append(build.get("output_bytes", 0))
+        if preview.get("peak_memory_bytes"):
+            _samples["peak_memory_bytes"].append(preview["peak_memory_bytes"])
+        _counters[f"builds.{command}"] += 1
+        _counters["builds.cached"] += bool(build.get("cached"))
+        _counters["builds.shared"] += bool(build.get("shared"))
+
+    for stage, ms in timings.items():
+        observe("build_stage_seconds", ms / 1000, stage=stage)
+    observe("file_io_seconds", sum(timings.get(stage, 0.0) for stage in FILE_IO_STAGES) / 1000, command=command)
+    inc("builds", command=command, cached=str(bool(build.get("cached"))).lower(), shared=str(bool(build.get("shared"))).lower())
+    inc("build_output_bytes", build.get("output_bytes") or 0, command=command)
+
+    try:
+        _metrics_log().info(json.dumps({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "command": command,
+            "cached": bool(build.get("cached")),
+            "shared": bool(build.get("shared")),
+            "objects": build.get("object_count"),
+            "symbol": build.get("qr_info", {}).get("symbol"),
+            "output_bytes": build.get("output_bytes"),
+            "peak_memory_bytes": preview.get("peak_memory_bytes"),
+            "timings_ms": timings
+        }, separators=(",", ":")))
+    except OSError as e:
+        print(f"[metrics] ⚠️ Could not write metrics log: {e}")
+
+
+async def _monitor_loop_lag(interval: float):
+    # A sleep that wakes late means something blocked the event loop for the difference
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        record("loop_lag_ms", lag * 1000)
+        observe("event_loop_lag_seconds", lag)
+
+
+def start_loop_lag_monitor(interval: float = 0.5):
+    """
+    Start sampling event-loop lag on the running loop (idempotent; call from on_ready).
+    """
+    global _loop_lag_task
+    if _loop_lag_task is None or _loop_lag_task.done():
+        _loop_lag_task = asyncio.get_running_loop().create_task(_monitor_loop_lag(interval))
+
+
+def get_metrics_summary() -> dict:
+    """
+    {"stages": {stage: {"count", "p50", "p95", "p99"}}, "builds": {...counters},
+     "objects" / "output_bytes" / "peak_memory_bytes" / "loop_lag_ms": percentiles + max, "uptime_seconds"}
+    """
+    with _lock:
+        samples = {metric: list(values) for metric, values in _samples.items()}
+        counters = dict(_counters)
+
+    stage_names = [name[len("stage."):] for name in samples if name.startswith("stage.")]
+    ordered = [stage for stage in BUILD_STAGES if stage in stage_names] + sorted(set(stage_names) - set(BUILD_STAGES))
+    summary = {
+        "stages": {
+            stage: dict(count=len(samples[f"stage.{stage}"]), **percentiles(samples[f"stage.{stage}"]))
+            for stage in ordered
+        },
+        "builds": {name[len("builds."):]: value for name, value in counters.items() if name.startswith("builds.")}
+    }
+    for metric in ("objects", "output_bytes", "peak_memory_bytes", "loop_lag_ms"):
+        values = samples.get(metric, [])
+        summary[metric] = dict(percentiles(values), max=max(values) if values else 0.0, count=len(values))
+    summary["uptime_seconds"] = round(time.time() - _started)
+    return summary
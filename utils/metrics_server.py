@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from config import CONFIG
+from utils.build_cache import get_cache_stats
+from utils.build_queue import get_queue_stats
+from utils.decode_cache import get_decode_cache_stats
+from utils.metrics import LATENCY_BUCKETS, get_prometheus_series, inc, observe
+
+METRICS_PREFIX = "qr4me_"
+METRICS_HTTP_ENABLED = bool(CONFIG["metrics_http_enabled"])
+REQUEST_TIMEOUT = 5.0
+
+HELP = {
+    "command_duration_seconds": "Slash command latency from interaction creation to completion",
+    "build_stage_seconds": "Duration of each build stage (upload = gallery post)",
+    "file_io_seconds": "Disk time per build: JSON, tiles, cache store/restore and ZIP packaging",
+    "event_loop_lag_seconds": "Delay of a periodic asyncio wake-up; high values mean the loop was blocked",
+    "discord_api_seconds": "Discord REST call latency",
+    "discord_rate_limit_wait_seconds": "Time spent sleeping on Discord 429 responses",
+    "builds": "Finished builds",
+    "build_output_bytes": "Bytes written to build outputs",
+    "commands": "Completed slash commands",
+    "discord_api_requests": "Discord REST calls by method and status",
+    "discord_rate_limits": "Discord 429 responses that were retried",
+    "discord_global_rate_limits": "Discord global rate limits",
+}
+
+_server = None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_metrics(bot=None) -> str:
+    """
+    Everything /botstats knows, in the Prometheus text exposition format (version 0.0.4).
+    """
+    series = get_prometheus_series()
+    lines = []
+
+    def header(name: str, kind: str, text: str):
+        lines.append(f"# HELP {METRICS_PREFIX}{name} {text}")
+        lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+
+    # ✅ Histograms: cumulative buckets, +Inf, _sum and _count per label set
+    for name in sorted({name for name, _ in series["histograms"]}):
+        header(name, "histogram", HELP.get(name, name))
+        for (series_name, labels), values in sorted(series["histograms"].items()):
+            if series_name != name:
+                continue
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {count}")
+            lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{METRICS_PREFIX}{name}_sum{_format_labels(labels)} {_format_value(round(values[-2], 6))}")
+            lines.append(f"{METRICS_PREFIX}{name}_count{_format_labels(labels)} {values[-1]}")
+
+    for name in sorted({name for name, _ in series["counters"]}):
+        header(f"{name}_total", "counter", HELP.get(name, name))
+        for (series_name, labels), value in sorted(series["counters"].items()):
+            if series_name == name:
+                lines.append(f"{METRICS_PREFIX}{name}_total{_format_labels(labels)} {_format_value(value)}")
+
+    # ✅ Cache and queue counters are kept by their own modules; read them at scrape time
+    # (in memory only: the artifact index is loaded at startup, never by a scrape)
+    cache = get_cache_stats(scan=False)
+    decode = get_decode_cache_stats()
+    header("cache_lookups_total", "counter", "Cache lookups by cache and result")
+    for cache_name, hits, misses in (
+        ("matrix", cache["matrix_hits"], cache["matrix_misses"]),
+        ("artifact", cache["artifact_hits"], cache["artifact_misses"]),
+        ("decode", decode["attachment_hits"] + decode["content_hits"], decode["misses"]),
+    ):
+        lines.append(f'{METRICS_PREFIX}cache_lookups_total{{cache="{cache_name}",result="hit"}} {hits}')
+        lines.append(f'{METRICS_PREFIX}cache_lookups_total{{cache="{cache_name}",result="miss"}} {misses}')
+    header("cache_evictions_total", "counter", "Build artifact cache evictions")
+    lines.append(f"{METRICS_PREFIX}cache_evictions_total {cache['evictions']}")
+    if cache["artifact_bytes"] is not None:
+        header("cache_bytes", "gauge", "Size of the build artifact cache on disk")
+        lines.append(f"{METRICS_PREFIX}cache_bytes {cache['artifact_bytes']}")
+
+    queue = get_queue_stats()
+    header("build_queue_depth", "gauge", "Builds waiting for a build slot")
+    lines.append(f"{METRICS_PREFIX}build_queue_depth {queue['depth']}")
+    header("build_queue_running", "gauge", "Builds currently running")
+    lines.append(f"{METRICS_PREFIX}build_queue_running {queue['running']}")
+    header("build_queue_rejected_total", "counter", "Builds rejected because the queue was full")
+    lines.append(f"{METRICS_PREFIX}build_queue_rejected_total {queue['rejected']}")
+
+    if bot is not None and bot.latency == bot.latency:  # NaN until the first heartbeat
+        header("discord_gateway_latency_seconds", "gauge", "Discord gateway heartbeat latency")
+        lines.append(f"{METRICS_PREFIX}discord_gateway_latency_seconds {_format_value(round(bot.latency, 6))}")
+
+    return "\n".join(lines) + "\n"
+
+
+def discord_http_trace() -> aiohttp.TraceConfig:
+    """
+    aiohttp trace hooks for the bot's REST session (commands.Bot(http_trace=...)):
+    every Discord API call is timed and counted by method and status.
+    """
+    async def on_request_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        observe("discord_api_seconds", time.perf_counter() - context.started, method=params.method)
+        inc("discord_api_requests", method=params.method, status=params.response.status)
+
+    async def on_request_exception(session, context, params):
+        inc("discord_api_requests", method=params.method, status="error")
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+class RateLimitLogHandler(logging.Handler):
+    """
+    discord.py only reports 429 back-off through the discord.http logger
+    ("... responded with 429. Retrying in %.2f seconds."), so count those records.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        message = str(record.msg)
+        if message.startswith("Global rate limit has been hit"):
+            # Logged in addition to the 429 below for the same sleep; count it, don't time it twice
+            inc("discord_global_rate_limits")
+            return
+        if "responded with 429" not in message or "Retrying in" not in message:
+            return
+        method, url, wait = record.args
+        inc("discord_rate_limits", method=method)
+        observe("discord_rate_limit_wait_seconds", float(wait), method=method)
+
+
+def instrument_discord_logging():
+    logger = logging.getLogger("discord.http")
+    if not any(isinstance(handler, RateLimitLogHandler) for handler in logger.handlers):
+        logger.addHandler(RateLimitLogHandler(level=logging.WARNING))
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, bot):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+        method, path = (request.split(b"\r\n", 1)[0].decode("latin-1").split(" ") + ["", ""])[:2]
+        if method == "GET" and path.split("?", 1)[0] == "/metrics":
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", render_metrics(bot).encode("utf-8")
+        else:
+            status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"Not found; try /metrics\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(bot=None):
+    """
+    Serve /metrics on the running event loop when metrics_http_enabled is set (idempotent; call from on_ready).
+    Returns the asyncio server, or None when disabled or the port could not be bound.
+    """
+    global _server
+    if not METRICS_HTTP_ENABLED or _server is not None:
+        return _server
+
+    host, port = CONFIG["metrics_http_host"], CONFIG["metrics_http_port"]
+    try:
+        _server = await asyncio.start_server(lambda reader, writer: _handle(reader, writer, bot), host, port)
+    except OSError as e:
+        print(f"[metrics_server] ❌ Could not listen on {host}:{port}: {e}")
+        return None
+    print(f"[metrics_server] ✅ Prometheus metrics on http://{host}:{port}/metrics")
+    return _server
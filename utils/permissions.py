@@ -1,9 +1,22 @@
 import json
 import os
+import time
 
 CONFIG_PATH = "config.json"
 ADMIN_USERS_FILE = "data/admin_users.json"
 
+# How often (seconds) file mtimes are re-checked; checks in between never touch disk
+PERMISSION_RECHECK_SECONDS = 2.0
+
+# ✅ In-memory permission cache: server_id -> frozenset(user ids), plus global admin role ids
+_permission_cache = {
+    "permitted_users": None,
+    "admin_roles": None,
+    "admin_users_mtime": None,
+    "config_mtime": None,
+    "checked_at": 0.0
+}
+
 def _load_admin_users():
     if not os.path.exists(ADMIN_USERS_FILE):
         return {}
@@ -26,6 +39,43 @@ def _save_admin_users(data):
     with open(ADMIN_USERS_FILE, "w") as f:
         json.dump(data, f, indent=2)
 
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _set_permitted_users(data: dict):
+    _permission_cache["permitted_users"] = {
+        sid: frozenset(value.get("permitted_users", []))
+        for sid, value in data.items()
+    }
+    _permission_cache["admin_users_mtime"] = _mtime(ADMIN_USERS_FILE)
+
+def _refresh_permission_cache():
+    """
+    Reload permitted users / admin roles only when their file changed on disk.
+    """
+    now = time.monotonic()
+    cache = _permission_cache
+    if cache["permitted_users"] is not None and now - cache["checked_at"] < PERMISSION_RECHECK_SECONDS:
+        return
+    cache["checked_at"] = now
+
+    if cache["permitted_users"] is None or _mtime(ADMIN_USERS_FILE) != cache["admin_users_mtime"]:
+        _set_permitted_users(_load_admin_users())
+
+    config_mtime = _mtime(CONFIG_PATH)
+    if cache["admin_roles"] is None or config_mtime != cache["config_mtime"]:
+        with open(CONFIG_PATH, "r") as f:
+            config = json.load(f)
+        cache["admin_roles"] = frozenset(str(role_id) for role_id in config.get("admin_roles", []))
+        cache["config_mtime"] = config_mtime
+
+def invalidate_permission_cache():
+    _permission_cache["permitted_users"] = None
+    _permission_cache["admin_roles"] = None
+
 def is_admin_user(interaction) -> bool:
     """
     Checks if the user is allowed based on:
@@ -47,19 +97,16 @@ def is_admin_user(interaction) -> bool:
         ):
             return True
 
+        _refresh_permission_cache()
+
         # Server-specific permitted users
-        data = _load_admin_users()
-        permitted = data.get(server_id, {}).get("permitted_users", [])
+        permitted = _permission_cache["permitted_users"].get(server_id, frozenset())
 
         if user_id in permitted:
             return True
 
         # Global admin role fallback
-        with open(CONFIG_PATH, "r") as f:
-            config = json.load(f)
-        admin_roles = config.get("admin_roles", [])
-
-        return any(role_id in admin_roles for role_id in user_roles)
+        return not _permission_cache["admin_roles"].isdisjoint(user_roles)
 
     except Exception as e:
         print(f"[permissions] Error in is_admin_user: {e}")
@@ -78,6 +125,7 @@ def add_admin_user(user_id: int, server_id: str):
     if user_id_str not in data[server_id]["permitted_users"]:
         data[server_id]["permitted_users"].append(user_id_str)
         _save_admin_users(data)
+        _set_permitted_users(data)
 
 def remove_admin_user(user_id: int, server_id: str) -> bool:
     data = _load_admin_users()
@@ -89,4 +137,5 @@ def remove_admin_user(user_id: int, server_id: str) -> bool:
 
     data[server_id]["permitted_users"].remove(user_id_str)
     _save_admin_users(data)
+    _set_permitted_users(data)
     return True
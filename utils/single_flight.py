@@ -0,0 +1,44 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight async calls: the first caller for a key runs the work,
+    callers arriving while it is running await the same result (or exception).
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {"leaders": 0, "shared": 0}
+
+    async def do(self, key: str, work):
+        """
+        work is a zero-argument callable returning an awaitable. Returns (result, shared).
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["shared"] += 1
+            # shield: a cancelled follower must not cancel the leader's work
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["leaders"] += 1
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -1,12 +1,77 @@
 import os
+import json
+import zipfile
 
-def create_qr_zip(object_json_path: str, preview_image_path: str, zip_output_path: str, extra_text: str = "", export_mode: str = "json") -> str:
+# Already-compressed formats are stored as-is; deflating them again only costs CPU
+STORED_EXTENSIONS = {".png", ".webp", ".jpg", ".jpeg", ".zip"}
+
+# zlib level for object JSON: ~30x smaller at level 6, level 9 saves <1% more at ~1.4x the time
+JSON_COMPRESS_LEVEL = 6
+
+def _compression_for(path: str) -> tuple:
+    if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, JSON_COMPRESS_LEVEL
+
+def create_qr_zip(object_json_path: str, preview_image_path: str, zip_output_path: str, extra_text: str = "", export_mode: str = "zip", object_json_data: bytes = None, preview_data: bytes = None) -> str:
     """
-    Skips zip creation and returns only the path to the object JSON file.
-    Used for sending raw object layout directly into Discord without zipping.
+    Package a build as a ZIP: object JSON (deflated), preview (stored) and README.txt with extra_text.
+
+    object_json_data / preview_data are the bytes a fresh build already holds in memory; they
+    are packed directly under the file's name. Without them (cache-restored builds, streamed
+    previews) the file is read from its path. The archive is written next to its final path
+    then renamed, so /preview or /cleanup never see a half-written ZIP.
+    export_mode "json" skips packaging and returns the object JSON path (raw upload).
+    Returns the path of the file to upload.
     """
-    os.makedirs(os.path.dirname(object_json_path), exist_ok=True)
+    if export_mode == "json":
+        print(f"[zip_packager] 🔄 Export mode: '{export_mode}'. Returning JSON file only.")
+        return object_json_path
+
+    os.makedirs(os.path.dirname(zip_output_path) or ".", exist_ok=True)
+    temp_path = zip_output_path + ".tmp"
+
+    with zipfile.ZipFile(temp_path, "w") as zf:
+        for path, data in ((object_json_path, object_json_data), (preview_image_path, preview_data)):
+            if not path:
+                continue
+            compression, level = _compression_for(path)
+            if data is not None:
+                zf.writestr(os.path.basename(path), data, compress_type=compression, compresslevel=level)
+            elif os.path.exists(path):
+                zf.write(path, os.path.basename(path), compress_type=compression, compresslevel=level)
+        if extra_text:
+            zf.writestr("README.txt", extra_text, compress_type=zipfile.ZIP_DEFLATED, compresslevel=JSON_COMPRESS_LEVEL)
+
+    os.replace(temp_path, zip_output_path)
+    print(f"[zip_packager] ✅ Packed build into {zip_output_path}")
+    return zip_output_path
+
+def create_batch_zip(entries: list, zip_output_path: str, contact_sheet_path: str = None) -> str:
+    """
+    One archive for a /qrbatch run.
+
+    Parameters:
+    - entries: one dict per batch row; rows with an "object_output_path" are packed as
+      "objects/<file>", every row (including failed ones) is listed in batch.json
+    - zip_output_path: archive to write
+    - contact_sheet_path: optional overview image stored as "contact_sheet.png"
+    """
+    os.makedirs(os.path.dirname(zip_output_path), exist_ok=True)
+    manifest = []
+
+    with zipfile.ZipFile(zip_output_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for entry in entries:
+            entry = dict(entry)
+            object_path = entry.pop("object_output_path", None)
+            if object_path:
+                zf.write(object_path, f"objects/{entry['file']}", compresslevel=JSON_COMPRESS_LEVEL)
+            manifest.append(entry)
+
+        if contact_sheet_path:
+            # PNG data is already compressed
+            zf.write(contact_sheet_path, "contact_sheet.png", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("batch.json", json.dumps(manifest, indent=2))
 
-    # ✅ This logic simplifies everything — we return the raw .json file path directly
-    print(f"[zip_packager] 🔄 Export mode: '{export_mode}'. Returning JSON file only.")
-    return object_json_path
+    print(f"[zip_packager] ✅ Packed {len(entries)} batch builds into {zip_output_path}")
+    return zip_output_path